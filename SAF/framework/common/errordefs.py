@@ -50,6 +50,15 @@ class StateRecordError(Exception):
         return repr(self.msg)
 
 
+class UnsupportedQueryError(Exception):
+    """ Raised when a query can not be answered by the columnar engine """
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return repr(self.msg)
+
+
 class ConstraintError(Exception):
     """ Raised when Processing Constraints """
     def __init__(self, msg):
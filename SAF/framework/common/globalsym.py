@@ -48,6 +48,54 @@ class SymbolTable:
         self.namespaces = {}
         self.nsmap = {}
 
+        # Index from every dotted suffix of a symbol to the symbols having 
+        # it, in the order they were added to the table
+        self.suffixes = {}
+        # Symbols found for lookup keys and keys without any symbol
+        self.matches = {}
+        self.nomatches = set()
+        # Type codes of the values passed to symtype()
+        self.symtypes = {}
+        # Templates of state expressions compiled by the resolver
+        self.templates = {}
+
+    def index_symbol(self, fqvn):
+        """ Adds a symbol newly inserted in the table to the suffix index """
+        pos = 0
+        while pos >= 0:
+            self.suffixes.setdefault(fqvn[pos:], []).append(fqvn)
+            pos = fqvn.find(".", pos) + 1 or -1
+        # A key which did not match before may match the new symbol 
+        self.nomatches.clear()
+
+    def find_fqvn(self, key):
+        """
+            Returns the first symbol in the table ending with key or None.
+
+            Any symbol ending with "a.b.c" has "b.c" as a dotted suffix, so
+            only the symbols indexed under the part of the key after its 
+            first dot need to be checked. Symbols are never removed and new
+            ones go to the end of the table so a match once found stays the
+            first one.
+        """
+        fqvn = self.matches.get(key)
+        if(fqvn is not None):
+            return fqvn
+        if key in self.nomatches:
+            return None
+
+        dot = key.find(".")
+        if(dot >= 0):
+            candidates = self.suffixes.get(key[dot + 1:], [])
+        else:
+            candidates = self.table.iterkeys()
+        for ns in candidates:
+            if ns.endswith(key):
+                self.matches[key] = ns
+                return ns
+        self.nomatches.add(key)
+        return None
+
     def get_symbol(self, name, var, fullname=None):
 
         if(fullname):
@@ -56,11 +104,11 @@ class SymbolTable:
             key = name + "." + var
 
         key = key.strip()
-        for ns, v in self.table.items():
-            if(ns.find(key, -len(key)) >= 0):
-                if __debug__: self.logger.fine("Match found in Symbol table for %s in %s"\
-                                  % (key, ns))
-                return v
+        ns = self.find_fqvn(key)
+        if(ns is not None):
+            if __debug__: self.logger.fine("Match found in Symbol table for %s in %s"\
+                              % (key, ns))
+            return self.table[ns]
 
         if __debug__: self.logger.fine("NO Match in Symbol Table for " + key)
         return None
@@ -82,11 +130,11 @@ class SymbolTable:
                 key = val
                 if __debug__: self.logger.debug("Key with newctxt " + newctxt + " = " + key)
 
-        for ns, v in self.table.items():
-            if(ns.find(key, -len(key)) >= 0):
-                if __debug__: self.logger.fine("Qualified symbol found in Symbol table for\
-                %s in %s" % (key, ns))
-                return '$' + ns
+        ns = self.find_fqvn(key)
+        if(ns is not None):
+            if __debug__: self.logger.fine("Qualified symbol found in Symbol table for\
+            %s in %s" % (key, ns))
+            return '$' + ns
         if __debug__: self.logger.fine("NO Match in Symbol Table for " + key)
         return var
 
@@ -94,11 +142,9 @@ class SymbolTable:
     def has_symbol(self, v):
         sym = v.replace('$', '')
         sym = sym.strip();
-        l = len(sym)
-        for ns, v in self.table.items():
-            if(ns.find(sym, -l) >= 0):
-                if __debug__: self.logger.fine("Match found in Symbol table for " + sym)
-                return True
+        if(self.find_fqvn(sym) is not None):
+            if __debug__: self.logger.fine("Match found in Symbol table for " + sym)
+            return True
         if __debug__: self.logger.fine("NO Match in Symbol Table for " + sym)
         return False
 
@@ -197,7 +243,7 @@ class SymbolTable:
         prefix = namespace + "." + name + "."
 
         for k, v in symbolhash.items():
-            self.table[prefix + k] = v
+            self.set_symbol(prefix + k, v)
 
     def add_symbol(self, symbol, value, namespace, name):
         if(namespace not in self.namespaces):
@@ -207,10 +253,23 @@ class SymbolTable:
             if(name not in nlist):
                 nlist.append(name)
         prefix = namespace + "." + name + "."
-        self.table[prefix + symbol] = value
+        self.set_symbol(prefix + symbol, value)
         return prefix+symbol
 
+    def set_symbol(self, fqvn, value):
+        if fqvn not in self.table:
+            self.index_symbol(fqvn)
+        self.table[fqvn] = value
+
     def symtype(self, val):
+        if(type(val) is not str):
+            return self.get_code_const()
+        code = self.symtypes.get(val)
+        if(code is None):
+            code = self.symtypes[val] = self.get_symtype(val)
+        return code
+
+    def get_symtype(self, val):
         var = v = ''
         if(type(val) is str): v = val.strip()
         if __debug__: self.logger.fine("\t Checking type of variable value: " + v)
@@ -0,0 +1,114 @@
+# idset.py - Compact set of integer ids held as bitmaps
+#
+# Copyright (C) 2011 University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms are permitted
+# provided that the above copyright notice and this paragraph are
+# duplicated in all such forms and that any documentation, advertising
+# materials, and other materials related to such distribution and use
+# acknowledge that the software was developed by the University of
+# Southern California, Information Sciences Institute.  The name of the
+# University may not be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED "AS IS" AND WITHOUT ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, WITHOUT LIMITATION, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+# Author: Arun Viswanathan (aviswana@usc.edu)
+#------------------------------------------------------------------------------
+# Every chunk holds the bits of CHUNK_SIZE consecutive ids
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_BYTES = CHUNK_SIZE >> 3
+LOW_MASK = CHUNK_SIZE - 1
+
+
+class IdSet:
+    """
+        Set of integer ids (e.g. event numbers) held as bitmaps. The ids
+        are split into chunks of CHUNK_SIZE consecutive ids and only the
+        chunks having an id get a bitmap, so that dense ids take a bit
+        each and sparse ones a bitmap per cluster.
+
+        Membership, addition and removal are single bit operations. An
+        IdSet hashes on its ids and must not be modified while used as a
+        key.
+    """
+
+    def __init__(self, ids=()):
+        self.clear()
+        for i in ids:
+            self.add(i)
+
+    def clear(self):
+        self.chunks = {}
+        self.count = 0
+        self.hashval = None
+
+    def add(self, i):
+        key = i >> CHUNK_BITS
+        bits = self.chunks.get(key)
+        if bits is None:
+            bits = self.chunks[key] = bytearray(CHUNK_BYTES)
+        low = i & LOW_MASK
+        mask = 1 << (low & 7)
+        if not (bits[low >> 3] & mask):
+            bits[low >> 3] |= mask
+            self.count += 1
+            self.hashval = None
+
+    def discard(self, i):
+        bits = self.chunks.get(i >> CHUNK_BITS)
+        if bits is None:
+            return
+        low = i & LOW_MASK
+        mask = 1 << (low & 7)
+        if (bits[low >> 3] & mask):
+            bits[low >> 3] &= ~mask
+            self.count -= 1
+            self.hashval = None
+
+    def __contains__(self, i):
+        bits = self.chunks.get(i >> CHUNK_BITS)
+        if bits is None:
+            return False
+        low = i & LOW_MASK
+        return ((bits[low >> 3] >> (low & 7)) & 1) == 1
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """ Iterates over the ids in ascending order """
+        for key in sorted(self.chunks):
+            base = key << CHUNK_BITS
+            bits = self.chunks[key]
+            for pos in xrange(CHUNK_BYTES):
+                byte = bits[pos]
+                if byte:
+                    for b in xrange(8):
+                        if (byte >> b) & 1:
+                            yield base + (pos << 3) + b
+
+    def get_bitmaps(self):
+        """ Returns the non-empty bitmaps by chunk """
+        return dict([(k, str(v)) for (k, v) in self.chunks.items() if any(v)])
+
+    def __eq__(self, other):
+        if not isinstance(other, IdSet):
+            return False
+        return ((self.count == other.count) and
+                (self.get_bitmaps() == other.get_bitmaps()))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        if self.hashval is None:
+            self.hashval = hash(frozenset(self.get_bitmaps().items()))
+        return self.hashval
+
+    def __repr__(self):
+        return "IdSet(%d ids)" % (self.count)
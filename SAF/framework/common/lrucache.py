@@ -0,0 +1,107 @@
+# lrucache.py - Bounded cache with least recently used eviction
+#
+# Copyright (C) 2011 University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms are permitted
+# provided that the above copyright notice and this paragraph are
+# duplicated in all such forms and that any documentation, advertising
+# materials, and other materials related to such distribution and use
+# acknowledge that the software was developed by the University of
+# Southern California, Information Sciences Institute.  The name of the
+# University may not be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED "AS IS" AND WITHOUT ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, WITHOUT LIMITATION, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+# Author: Arun Viswanathan (aviswana@usc.edu)
+#------------------------------------------------------------------------------
+
+# Positions in a node of the doubly linked list
+PREV, NEXT, KEY, VALUE, SIZE = 0, 1, 2, 3, 4
+
+
+class LRUCache:
+    """
+        Cache holding entries with a total size of at most maxsize. Every
+        entry has a size of one unless given otherwise. When full, adding 
+        an entry evicts the least recently used ones.
+
+        Entries are kept in a doubly linked list in the order of use with
+        the most recently used entry at the end.
+    """
+
+    def __init__(self, maxsize):
+        if(maxsize <= 0):
+            raise Exception("Size of the cache must be positive!")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clear()
+
+    def clear(self):
+        self.map = {}
+        self.size = 0
+        self.root = root = []
+        root[:] = [root, root, None, None, 0]
+
+    def __len__(self):
+        return len(self.map)
+
+    def __contains__(self, key):
+        return key in self.map
+
+    def get(self, key, default=None):
+        """
+            Returns the value for the key (or default) and marks the entry
+            most recently used
+        """
+        node = self.map.get(key)
+        if node is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._unlink(node)
+        self._append(node)
+        return node[VALUE]
+
+    def put(self, key, value, size=1):
+        """
+            Adds or replaces the entry for the key. An entry larger than 
+            the cache is not added.
+        """
+        node = self.map.pop(key, None)
+        if node is not None:
+            self._unlink(node)
+            self.size -= node[SIZE]
+        if(size > self.maxsize):
+            return
+        while(self.size + size > self.maxsize):
+            oldest = self.root[NEXT]
+            self._unlink(oldest)
+            del self.map[oldest[KEY]]
+            self.size -= oldest[SIZE]
+            self.evictions += 1
+        node = [None, None, key, value, size]
+        self._append(node)
+        self.map[key] = node
+        self.size += size
+
+    def get_stats(self):
+        """ Returns the number of hits, misses and evictions """
+        return (self.hits, self.misses, self.evictions)
+
+    def _unlink(self, node):
+        node[PREV][NEXT] = node[NEXT]
+        node[NEXT][PREV] = node[PREV]
+
+    def _append(self, node):
+        root = self.root
+        last = root[PREV]
+        node[PREV] = last
+        node[NEXT] = root
+        last[NEXT] = node
+        root[PREV] = node
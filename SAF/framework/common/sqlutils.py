@@ -18,17 +18,140 @@
 #
 # Author: Arun Viswanathan (aviswana@usc.edu)
 #------------------------------------------------------------------------------
+# Standard Imports
+import re
+
+# Text which SQLite converts to a number when compared with a column
+# having numeric affinity
+NUMERIC_TEXT = re.compile(r'^\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*$')
+INTEGER_TEXT = re.compile(r'^\s*[+-]?\d+\s*$')
+
+
+def get_affinity(decltype):
+    """ Returns the SQLite column affinity for a declared column type """
+    t = (decltype or "").upper()
+    if(t.find("INT") >= 0):
+        return "INTEGER"
+    if((t.find("CHAR") >= 0) or (t.find("CLOB") >= 0) or
+       (t.find("TEXT") >= 0)):
+        return "TEXT"
+    if((t.find("BLOB") >= 0) or (not t)):
+        return "NONE"
+    if((t.find("REAL") >= 0) or (t.find("FLOA") >= 0) or
+       (t.find("DOUB") >= 0)):
+        return "REAL"
+    return "NUMERIC"
+
+
+def apply_affinity(text, affinity):
+    """
+        Returns the value a bound text is compared as against a column
+        with the given affinity. Text looking like a number is converted 
+        to a number for columns with numeric affinity.
+    """
+    if((affinity in ("TEXT", "NONE")) or (not NUMERIC_TEXT.match(text))):
+        return text
+    if INTEGER_TEXT.match(text):
+        return int(text)
+    return float(text)
 
 
 def attrhash_to_sql(kvhash, statename, globalsyms=None, fullobjname=None):
+    """
+        Converts a state expression hash to the WHERE clause of a SQL 
+        statement with '?' placeholders and returns it along with the tuple 
+        of values to be bound to the placeholders. 
+    """
+    terms = attrhash_to_terms(kvhash, statename, globalsyms, fullobjname)
+    return (terms_to_template(terms), terms_to_params(terms))
+
+
+def get_terms_shape(terms):
+    """
+        Returns the attributes and operators of the terms. Terms with the 
+        same shape map to the same statement template.
+    """
+    return tuple([(k, op) for (k, op, v) in terms])
+
+
+def terms_to_template(terms):
+    """
+        Converts a list of (attribute, operator, value) terms returned by 
+        attrhash_to_terms() into the WHERE clause of a SQL statement with a
+        '?' placeholder for every value
+    """
+    expr = []
+    for (k, op, v) in terms:
+        expr.append(k)
+        if(op):
+            expr.append(op)
+        if(v is not None):
+            expr.append("?")
+        expr.append("and")
+
+    # Remove the extra 'and' from the back of the list
+    if(expr):
+        expr.pop()
+    sqlform = " ".join(expr)
+    return (sqlform)
+
+
+def terms_to_join(terms, evalias="e", bindalias="b"):
+    """
+        Converts a list of terms into the join condition between an event
+        table (evalias) and a table of bindings (bindalias) having a column
+        p<i> for the i-th value of the terms. Returns None if the terms can
+        not be joined.
+    """
     expr = []
+    index = 0
+    for (k, op, v) in terms:
+        if(k == "1=1"):
+            expr.append(k)
+        elif(v is None):
+            return None
+        else:
+            expr.append("%s.%s %s %s.p%d" % (evalias, k, op, bindalias, index))
+            index += 1
+    return " and ".join(expr)
+
+
+def terms_to_params(terms):
+    """ Returns the tuple of values to be bound to a terms template """
+    return tuple([v for (k, op, v) in terms if v is not None])
+
+
+def to_sql_text(value):
+    """ 
+        Returns the text of a state value to be bound as a SQL parameter 
+        with surrounding quotes removed
+    """
+    if(not isinstance(value, basestring)):
+        value = str(value)
+    if ((value.startswith("'") and value.endswith("'")) or\
+        (value.startswith("\"") and value.endswith("\""))):
+        value = value[1:-1]
+    if(isinstance(value, unicode)):
+        return value
+    return value.decode('utf-8')
+
+
+def attrhash_to_terms(kvhash, statename, globalsyms=None, fullobjname=None):
+    """
+        Converts a state expression hash to a list of 
+        (attribute, operator, value) terms which are ANDed together. 
+        
+        The operator is a SQL relational operator, "GLOB" or "NOT GLOB" 
+        and the value is the text to compare with. Unconstrained ($1 $2) 
+        variables are returned as the always true term ("1=1", None, None)
+    """
+    terms = []
     
     for k, v in kvhash.items():
         # A wildcard * is replaced with a "GLOB *" in SQL Query
         if((type(v) is str) and 
            (globalsyms.symtype(v) == globalsyms.get_code_any())):
-            expr.append(k)
-            expr.append("GLOB")
+            termop = "GLOB"
             newv = v        
 
             # Check if the wildcarded expression is preceded by 
@@ -39,7 +162,7 @@ def attrhash_to_sql(kvhash, statename, globalsyms=None, fullobjname=None):
                                     None, 
                                     fullname=fullobjname + "." + k + "_op")
                 if op == "!=":
-                    expr.append("NOT")                 
+                    termop = "NOT GLOB"                 
 
         else:           
             newv = v
@@ -60,8 +183,6 @@ def attrhash_to_sql(kvhash, statename, globalsyms=None, fullobjname=None):
                     raise Exception("Unrecognized attributes %s" %\
                                      (statename + "." + k))
             
-            expr.append(k)
-
             if(globalsyms and fullobjname):
                 op = globalsyms.get_symbol(None, 
                                     None, 
@@ -69,21 +190,14 @@ def attrhash_to_sql(kvhash, statename, globalsyms=None, fullobjname=None):
                 if(not op):
                     op = "="
                     
-            if(k != "1=1"):
-                expr.append(op)
+            termop = op
+            if(k == "1=1"):
+                termop = None
             
+        termval = None
         if(newv):
-            newv = str(newv)
-            if ((newv.startswith("'") and newv.endswith("'")) or\
-                (newv.startswith("\"") and newv.endswith("\""))):
-                expr.append(newv)
-            else:
-                expr.append("'%s'" %(newv))
-                
-        expr.append("and")
+            termval = to_sql_text(newv)
+
+        terms.append((k, termop, termval))
     
-    # Remove the extra 'and' from the back of the list
-    if(expr):
-        expr.pop()
-    sqlform = " ".join(expr)
-    return (sqlform)
+    return terms
@@ -21,6 +21,8 @@
 
 # Standard Imports
 import os
+import Queue
+import urllib
 from time import time
 from threading import Lock
 
@@ -32,25 +34,59 @@ try:
 except:
     from pysqlite2 import dbapi2 as sqlite3
 
-# Local Imports
-import framework.common.utils as utils
+# Named profiles of the pragmas set on every connection to a database. 
+# cache_size is negative to be taken in KiB rather than pages and page_size
+# only takes effect when the database is created. 
+PRAGMA_PROFILES = {
+    # Event databases are read by the state queries and only written when 
+    # indexes and statistics are added. Event databases are created by the
+    # normalizers, so page_size is ignored on them unless SAF creates the
+    # file itself (e.g. a missing or empty database).
+    'events' : [('page_size', 4096),
+                ('cache_size', -256 * 1024),
+                ('mmap_size', 256 * 1024 * 1024),
+                ('temp_store', 'MEMORY'),
+                ('synchronous', 'NORMAL')],
+    # State databases are temporary and written all the time. Losing them 
+    # in a crash is harmless.
+    'state' : [('page_size', 4096),
+               ('cache_size', -64 * 1024),
+               ('journal_mode', 'WAL'),
+               ('synchronous', 'OFF'),
+               ('temp_store', 'MEMORY')],
+    # Read-only connections can only change settings of the connection
+    'readonly' : [('cache_size', -256 * 1024),
+                  ('mmap_size', 256 * 1024 * 1024),
+                  ('temp_store', 'MEMORY')],
+}
+
+
+def get_profile_pragmas(profile):
+    """ Returns the PRAGMA statements of a named profile """
+    if profile not in PRAGMA_PROFILES:
+        raise Exception("Unknown storage profile '%s'. Valid profiles: %s" % \
+                        (profile, ", ".join(sorted(PRAGMA_PROFILES))))
+    return ["PRAGMA %s=%s" % (k, v) for (k, v) in PRAGMA_PROFILES[profile]]
 
 
 class SqliteStorage:
 
-    CACHE_SIZE_PERCENTAGE = 20
-    PAGE_SIZE_DEFAULT = 1024
-    INTERNAL_TABLES = ['sqlite_sequence']
+    INTERNAL_TABLES = ['sqlite_sequence', 'sqlite_stat1', 'sqlite_stat4']
+    # Number of compiled statements cached by the driver per connection
+    STATEMENT_CACHE_SIZE = 1000
+    # Number of rows fetched at a time by iter_sql()
+    FETCH_BATCH_SIZE = 5000
 
-    def __init__(self, dbname, logger=None, pragmas=True):
+    def __init__(self, dbname, logger=None, profile=None):
         """
-            Establishes a connection to the database and executes
-            a set of default SQLite pragmas.
+            Establishes a connection to the database and executes the 
+            pragmas of the named profile (see PRAGMA_PROFILES) if given.
         """
         
         # Initialize the logger for this module
         self.logger = logger
         self.within_transaction = False
+        self.readonly = False
 
         self.dbname = dbname
         if(self.dbname != ":memory:"):
@@ -58,10 +94,7 @@ class SqliteStorage:
                 f = open(self.dbname, "w");
                 f.close()
 
-        self.conn = sqlite3.connect(self.dbname, 
-                                    check_same_thread=False)
-        self.conn.isolation_level = None
-        self.c = self.conn.cursor()
+        self.connect()
         
         if __debug__: 
             self.updates = 0
@@ -73,25 +106,74 @@ class SqliteStorage:
             self.deletes = 0
             self.transactions = 0
 
-        # Get available memory
-        self.mem = utils.get_available_memory()
+        # Make optimization settings 
+        self.profile = profile
+        if profile:
+            self.set_pragmas()
 
+    def connect(self, readonly=False):
+        """
+            Opens the connection to the database. A read-only connection 
+            is used if asked for and supported by the SQLite library.
+        """
+        self.conn = None
+        if readonly:
+            self.conn = open_readonly_connection(self.dbname,
+                                                 self.STATEMENT_CACHE_SIZE)
+            if((self.conn is None) and __debug__ and self.logger):
+                self.logger.info("Read-only connections not supported. "
+                                 "Opening %s for writing" % (self.dbname))
+        self.readonly = (self.conn is not None)
+        if(self.conn is None):
+            self.conn = sqlite3.connect(self.dbname, 
+                                    check_same_thread=False,
+                                    cached_statements=self.STATEMENT_CACHE_SIZE)
+        self.conn.isolation_level = None
+        self.c = self.conn.cursor()
+        self.within_transaction = False
+
+    def set_connection(self, conn, readonly=True):
+        """
+            Uses a connection opened elsewhere (e.g. checked out of a
+            ConnectionPool) which already has its pragmas set
+        """
+        self.conn = conn
+        self.readonly = readonly
+        self.c = self.conn.cursor()
+        self.within_transaction = False
+
+    def set_pragmas(self):
+        profile = self.profile
+        if self.readonly:
+            profile = 'readonly'
         if __debug__: 
-            self.logger.info("Available Physical Memory : %d" % (self.mem))
-        cachesize = (self.mem * self.CACHE_SIZE_PERCENTAGE / 100)
-        cache_pages = cachesize / self.PAGE_SIZE_DEFAULT
-        if __debug__: 
-            self.logger.info("SQL Cache Size  : %d" % (cache_pages))
+            self.logger.info("Storage profile for %s: %s" % \
+                             (self.dbname, profile))
+        for pragma in get_profile_pragmas(profile):
+            self.execute_sql(pragma)
 
-        # Make optimization settings 
-        if pragmas:
-            self.execute_sql("PRAGMA auto_vacuum=NONE")
-            # Disable immediate writes to disk
-            self.execute_sql("PRAGMA synchronous=off")
-            self.execute_sql("PRAGMA temp_store=MEMORY")
-            self.execute_sql("PRAGMA default_cache_size=%d" % (cache_pages))
-            self.execute_sql("PRAGMA journal_mode=OFF")
-            self.execute_sql("PRAGMA count_changes=OFF")
+    def reconnect(self, readonly=False):
+        """
+            Replaces the connection with a new one to the same database. 
+            A forked process must not use the connection of its parent.
+        """
+        self.connect(readonly)
+        if self.profile:
+            self.set_pragmas()
+
+    def close(self):
+        """
+            Closes the connection to the database. A writable connection
+            first runs PRAGMA optimize so that the statistics of the tables
+            and indexes written over the connection are brought up to date.
+        """
+        if(self.conn is None):
+            return
+        if not self.readonly:
+            self.execute_sql("PRAGMA optimize")
+        self.conn.close()
+        self.conn = None
+        self.c = None
             
 
     def update_stats(self, sqlstmt):
@@ -171,11 +253,12 @@ class SqliteStorage:
             for line in self.c.iterdump():
                 f.write('%s\n' % line)
 
-    def execute_sql_returnall(self, sqlstmt):
+    def execute_sql_returnall(self, sqlstmt, params=()):
         """
             Executes input SQL query and returns a list of n-tuples
             where each n-tuple in the list corresponds to a table row 
-            of n columns.
+            of n columns. params are bound to the placeholders in the 
+            query which lets the driver reuse the compiled statement.
             
             Output Format:
                 result = [ (r1c1, r1c2,..., r1cn), ..., (rkc1, rkc2,..., rkcn)]
@@ -186,7 +269,7 @@ class SqliteStorage:
             self.logger.sqlcmd("%s"% (sqlstmt))
                         
         try:
-            self.c.execute(sqlstmt)
+            self.c.execute(sqlstmt, params)
         except sqlite3.OperationalError:
             return (None, 2)
         except sqlite3.Error, e:
@@ -207,6 +290,50 @@ class SqliteStorage:
         return (result, 0)
 
 
+    def iter_sql(self, sqlstmt, params=(), batchsize=None):
+        """
+            Executes input SQL query and yields the rows of the result in 
+            lists of at most batchsize n-tuples (FETCH_BATCH_SIZE by 
+            default) so that the whole result is never held at once. 
+            The query runs on a cursor of its own and other statements 
+            can be executed between the batches.
+
+            Nothing is yielded if the query refers to a column missing
+            from the table (e.g. a state query over a table of another
+            event type). Any other error raises an exception so that a
+            failed query is never taken for an empty result.
+        """
+        if __debug__:
+            self.update_stats(sqlstmt)
+            self.logger.sqlcmd("%s"% (sqlstmt))
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(sqlstmt, params)
+        except sqlite3.OperationalError as e1:
+            cursor.close()
+            if(str(e1).startswith("no such column")):
+                if __debug__: self.logger.debug("Sqlite3 Operational Error: %s \
+                            \n while executing %s" % (e1, sqlstmt))
+                return
+            raise Exception("Sqlite3 Operational Error: %s \
+                            \n while executing %s" % (e1, sqlstmt))
+        except sqlite3.Error as e2:
+            cursor.close()
+            raise Exception("Sqlite3 Generic Error: %s \
+                            \n while executing %s" % (e2, sqlstmt))
+
+        batchsize = batchsize or self.FETCH_BATCH_SIZE
+        try:
+            while True:
+                rows = cursor.fetchmany(batchsize)
+                if(not rows):
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+
     def begin_transaction(self):
         """
             Begins a database transaction 
@@ -261,3 +388,86 @@ class SqliteStorage:
 
         return (0)
 
+
+
+def open_readonly_connection(dbname, cached_statements=100):
+    """
+        Opens a read-only connection to an immutable snapshot of the 
+        database. SQLite takes no locks for the connection and does not 
+        look for changes made by others, so the database must not be 
+        written while the connection is open. Temporary tables can still 
+        be created. Returns None if the SQLite library does not open URIs.
+    """
+    path = os.path.abspath(dbname)
+    uri = "file:%s?mode=ro&immutable=1" % (urllib.pathname2url(path))
+    try:
+        conn = sqlite3.connect(uri, check_same_thread=False,
+                               cached_statements=cached_statements)
+        dblist = conn.execute("PRAGMA database_list").fetchall()
+    except sqlite3.Error:
+        return None
+    if((not dblist) or (os.path.realpath(dblist[0][2]) != 
+                        os.path.realpath(path))):
+        # The URI was taken as the name of a file
+        conn.close()
+        return None
+    return conn
+
+
+class ConnectionPool:
+    """
+        Pool of read-only connections to a database which can be checked 
+        out by worker threads. Every connection is used by one thread at a
+        time and has its own cursors and temporary tables. Connections are 
+        opened when first needed up to the size of the pool, after which 
+        checkout() waits for a connection to be checked in.
+    """
+
+    def __init__(self, dbname, size, logger=None):
+        if(size <= 0):
+            raise Exception("Size of the connection pool must be positive!")
+        self.dbname = dbname
+        self.size = size
+        self.logger = logger
+        self.opened = 0
+        self.lock = Lock()
+        self.idle = Queue.Queue()
+
+    def open(self):
+        conn = open_readonly_connection(self.dbname, 
+                                        SqliteStorage.STATEMENT_CACHE_SIZE)
+        if(conn is None):
+            raise Exception("Could not open read-only connection to %s" % \
+                            (self.dbname))
+        conn.isolation_level = None
+        for pragma in get_profile_pragmas('readonly'):
+            conn.execute(pragma)
+        return conn
+
+    def checkout(self):
+        """ Returns an idle connection of the pool """
+        try:
+            return self.idle.get_nowait()
+        except Queue.Empty:
+            pass
+        with self.lock:
+            if(self.opened < self.size):
+                conn = self.open()
+                self.opened += 1
+                return conn
+        return self.idle.get()
+
+    def checkin(self, conn):
+        """ Returns a connection checked out with checkout() to the pool """
+        self.idle.put(conn)
+
+    def close(self):
+        """ Closes the idle connections """
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except Queue.Empty:
+                break
+            conn.close()
+            with self.lock:
+                self.opened -= 1
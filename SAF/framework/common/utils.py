@@ -29,6 +29,7 @@ import cPickle
 import base64
 import datetime
 import psutil
+from bisect import bisect_left, bisect_right
 
 # Credits for this 
 # http://www.daniweb.com/code/snippet216610.html
@@ -94,6 +95,15 @@ def get_timediff(t1, t2):
              datetime.datetime.fromtimestamp(time1))
 
 
+def serialize(obj):
+    """ Returns the binary pickle of obj to be stored as a BLOB """
+    return buffer(cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL))
+
+
+def deserialize(blob):
+    return cPickle.loads(str(blob))
+
+
 def marshal(obj):
      return base64.b64encode(cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL))
 
@@ -110,6 +120,30 @@ def get_index(self, a, x):
     raise ValueError
 
 
+def get_satisfying_ranges(keys, relop, threshold):
+    """
+        Returns the list of (lo, hi) position ranges of the sorted keys 
+        which satisfy 'key <relop> threshold'
+    """
+    numkeys = len(keys)
+    if(relop == ">="):
+        return [(bisect_left(keys, threshold), numkeys)]
+    elif(relop == ">"):
+        return [(bisect_right(keys, threshold), numkeys)]
+    elif(relop == "<="):
+        return [(0, bisect_right(keys, threshold))]
+    elif(relop == "<"):
+        return [(0, bisect_left(keys, threshold))]
+    elif(relop == "=="):
+        return [(bisect_left(keys, threshold), 
+                 bisect_right(keys, threshold))]
+    elif(relop == "!="):
+        return [(0, bisect_left(keys, threshold)), 
+                (bisect_right(keys, threshold), numkeys)]
+    else:
+        raise Exception("Unsupported operator %s" % (relop))
+
+
 def isfatal(status, output):
    """
         Checks if the output of a command did not succeed
@@ -0,0 +1,244 @@
+# columnstore.py - Columnar in-memory store for evaluating state
+#                  propositions over event tables
+#
+# Copyright (C) 2011 University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms are permitted
+# provided that the above copyright notice and this paragraph are
+# duplicated in all such forms and that any documentation, advertising
+# materials, and other materials related to such distribution and use
+# acknowledge that the software was developed by the University of
+# Southern California, Information Sciences Institute.  The name of the
+# University may not be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED "AS IS" AND WITHOUT ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, WITHOUT LIMITATION, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+# Author: Arun Viswanathan (aviswana@usc.edu)
+#------------------------------------------------------------------------------
+# Standard Imports
+import operator
+from fnmatch import fnmatchcase
+
+# Third Party Imports
+numpyfound = True
+try:
+    import numpy
+except ImportError:
+    numpyfound = False
+
+# Local Imports
+from framework.objects.eventgroup import EventGroup
+from framework.common.errordefs import UnsupportedQueryError
+from framework.common.sqlutils import get_affinity, NUMERIC_TEXT, INTEGER_TEXT
+
+# Relational operators supported over columns
+RELOPS = {'='  : operator.eq, '==' : operator.eq, 
+          '!=' : operator.ne, '<>' : operator.ne,
+          '>'  : operator.gt, '>=' : operator.ge,
+          '<'  : operator.lt, '<=' : operator.le}
+
+
+class ColumnTable:
+    """
+        Holds the columns of an event table read from the event database
+        one attribute at a time on demand. The rows themselves are not
+        kept. The rows matching a query are read back by their rowid.
+
+        Columns holding only numbers are kept as NumPy arrays along with
+        a mask of non-NULL values. Columns holding only text are dictionary
+        encoded as an array of codes into a sorted vocabulary where the
+        code -1 stands for NULL.
+    """
+    # Number of rows read back with a query
+    FETCH_SIZE = 5000
+
+    def __init__(self, eventdb, name, attrlist, typelist):
+        self.eventdb = eventdb
+        self.name = name
+        self.attrlist = attrlist
+        self.affinities = dict(zip(attrlist,
+                                   [get_affinity(t) for t in typelist]))
+        self.rowids = numpy.array(self.read_values("rowid"),
+                                  dtype=numpy.int64)
+        self.numrows = len(self.rowids)
+        self.columns = {}
+        self.eventnos = self.get_column('eventno')[1]
+
+    def read_values(self, attr):
+        (rows, status) = self.eventdb.execute_sql_returnall(
+                            "select %s from %s order by rowid" % \
+                            (attr, self.name))
+        return [r[0] for r in (rows or [])]
+
+    def get_rows(self, indices):
+        """
+            Returns the rows at the given (ascending) indices read from the
+            event database
+        """
+        rows = []
+        rowids = self.rowids[indices].tolist()
+        for i in range(0, len(rowids), self.FETCH_SIZE):
+            (val, status) = self.eventdb.execute_sql_returnall(
+                    "select * from %s where rowid IN (%s) order by rowid" % \
+                    (self.name, ",".join(map(str,
+                                             rowids[i:i + self.FETCH_SIZE]))))
+            rows.extend(val or [])
+        return rows
+
+    def get_column(self, attr):
+        if attr in self.columns:
+            return self.columns[attr]
+        if attr not in self.affinities:
+            raise UnsupportedQueryError("Unknown attribute %s in %s" % \
+                                        (attr, self.name))
+        values = self.read_values(attr)
+        present = [v for v in values if v is not None]
+
+        column = ("mixed", None, None)
+        if(all((type(v) in (int, long)) for v in present) and
+           (self.affinities[attr] != "TEXT")):
+            try:
+                data = numpy.array([0 if v is None else v for v in values],
+                                    dtype=numpy.int64)
+                valid = numpy.array([v is not None for v in values],
+                                    dtype=bool)
+                column = ("numeric", data, valid)
+            except OverflowError:
+                pass
+        elif(all(isinstance(v, basestring) for v in present)):
+            vocab = sorted(set(present))
+            codemap = dict((v, i) for (i, v) in enumerate(vocab))
+            codemap[None] = -1
+            codes = numpy.array([codemap[v] for v in values],
+                                dtype=numpy.int32)
+            column = ("text", codes, vocab)
+
+        self.columns[attr] = column
+        return column
+
+    def get_mask(self, attr, op, text):
+        """
+            Returns a boolean array marking the rows satisfying the term
+            'attr op text' following the SQLite comparison rules.
+        """
+        (kind, data, extra) = self.get_column(attr)
+        if(kind == "mixed"):
+            raise UnsupportedQueryError("Mixed types in %s.%s" % \
+                                        (self.name, attr))
+        if(op == "GLOB" or op == "NOT GLOB"):
+            if(text.find("[") >= 0):
+                raise UnsupportedQueryError("Character class in %s" % (text))
+            negate = (op == "NOT GLOB")
+            if(kind == "numeric"):
+                distinct = numpy.unique(data[extra])
+                matched = [v for v in distinct if fnmatchcase(str(v), text)]
+                found = numpy.in1d(data, matched)
+                if(negate):
+                    found = ~found
+                return extra & found
+            return self._vocab_mask(data, extra,
+                            lambda v: fnmatchcase(v, text) != negate)
+
+        if op not in RELOPS:
+            raise UnsupportedQueryError("Operator %s" % (op))
+        relfunc = RELOPS[op]
+
+        if(kind == "numeric"):
+            if((self.affinities[attr] != "NONE") and
+               NUMERIC_TEXT.match(text)):
+                if INTEGER_TEXT.match(text):
+                    value = int(text)
+                else:
+                    value = float(text)
+                return extra & relfunc(data, value)
+            # Numbers are always less than text in SQLite
+            if(op in ('!=', '<>', '<', '<=')):
+                return extra.copy()
+            return numpy.zeros(self.numrows, dtype=bool)
+
+        return self._vocab_mask(data, extra, lambda v: relfunc(v, text))
+
+    def _vocab_mask(self, codes, vocab, predicate):
+        # The trailing False is picked up by the NULL code -1
+        vocabmask = numpy.array([predicate(v) for v in vocab] + [False],
+                                dtype=bool)
+        return vocabmask[codes]
+
+
+class ColumnarEventStore:
+    """
+        Answers state propositions with vectorized masks over event tables
+        loaded once into NumPy arrays. Matching rows are kept as index
+        arrays and turned into Event objects only when returned.
+
+        Terms which can not be evaluated over the columns raise
+        UnsupportedQueryError and are left to the event database.
+    """
+
+    def __init__(self, logger, eventdb):
+        if not numpyfound:
+            raise Exception("The columnar engine requires NumPy!")
+        self.logger = logger
+        self.eventdb = eventdb
+        self.tables = {}
+
+    def get_table(self, tablename):
+        if tablename not in self.tables:
+            if __debug__:
+                self.logger.info("Loading table %s into columns" % (tablename))
+            (info, status) = self.eventdb.execute_sql_returnall(
+                                "PRAGMA table_info(%s)" % (tablename))
+            attrlist = [row[1] for row in info]
+            typelist = [row[2] for row in info]
+            self.tables[tablename] = ColumnTable(self.eventdb, tablename,
+                                                 attrlist, typelist)
+        return self.tables[tablename]
+
+    def get_matching_indices(self, table, terms, idlist=None):
+        """
+            Returns the array of row indices of the table satisfying all
+            the terms and having an eventno in idlist (if given)
+        """
+        mask = numpy.ones(table.numrows, dtype=bool)
+        if(idlist is not None):
+            mask &= numpy.in1d(table.eventnos, idlist)
+        for (attr, op, value) in terms:
+            if(attr == "1=1"):
+                continue
+            if(value is None):
+                raise UnsupportedQueryError("Term without value %s" % (attr))
+            if attr not in table.affinities:
+                # The query fails over a table without the attribute and 
+                # the table contributes no events 
+                return numpy.array([], dtype=numpy.int64)
+            mask &= table.get_mask(attr, op, value)
+        return numpy.flatnonzero(mask)
+
+    def get_events(self, terms, instances, stateobj):
+        """
+            Returns an EventGroup of events from the active tables matching
+            the terms. instances is the set of qualifying event numbers 
+            (if any).
+        """
+        idlist = None
+        if(instances):
+            idlist = numpy.array(list(instances), dtype=numpy.int64)
+
+        matches = []
+        for tablename in self.eventdb.get_active_tables():
+            table = self.get_table(tablename)
+            indices = self.get_matching_indices(table, terms, idlist)
+            matches.append((table, indices))
+
+        # All terms are evaluated before creating any events so that an
+        # unsupported term leaves nothing half done
+        evgroup = EventGroup()
+        for (table, indices) in matches:
+            if(len(indices) > 0):
+                rows = table.get_rows(indices)
+                self.eventdb.add_events(table.name, rows, stateobj, evgroup)
+        return evgroup
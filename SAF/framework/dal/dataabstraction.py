@@ -22,26 +22,71 @@
 
 import framework.common.sqlutils as sqlutils
 from framework.objects.behaviorinstancelist import BehaviorInstanceList
-from framework.objects.event import Event
 from framework.objects.eventgroup import EventGroup
 from framework.statemanager.statedb import StateDatabase
+from framework.common.errordefs import UnsupportedQueryError
+from framework.dal.hashindex import EventHashIndex
+from framework.common.lrucache import LRUCache
 from copy import deepcopy
 
 class DataManager:
     """
         Provides a behavior abstraction for the model processing algorithm.
     """
+    # Number of bindings of a shape from which on they are matched with a 
+    # hash index of all candidate events instead of a join touching only
+    # the matching ones
+    HASH_INDEX_MIN_BINDINGS = 64
+
+    # Total number of events (or rows of hash indexes) held by the query
+    # cache
+    MAX_QUERY_CACHE_SIZE = 500000
        
-    def __init__(self, logger, eventdb, symtable):
+    def __init__(self, logger, eventdb, symtable, columnstore=None):
         self.logger  = logger
         self.eventdb = eventdb
+        # Optional columnar store answering state queries 
+        self.columnstore = columnstore
         self.globalsyms = symtable        
         self.tablenamehash = {}
-        self.query_cache = {}
+        # Results of state queries by canonical key of the query along
+        # with the hash indexes over candidate events of equality bindings
+        self.query_cache = LRUCache(self.MAX_QUERY_CACHE_SIZE)
+        # Set of qualifying event numbers loaded into the event database
+        self.qualifying = None
+        # Statement templates indexed by state name and shape of the terms
+        self.statement_cache = {}
    
     def reset_query_cache(self):
         self.query_cache.clear()
 
+    def get_cache_stats(self):
+        """ Returns the hits, misses and evictions of the query cache """
+        return self.query_cache.get_stats()
+
+    def get_cache_key(self, terms, instances=None):
+        """
+            Returns the key of the query cache for the terms restricted to 
+            the qualifying event numbers (instances). The key is the same
+            irrespective of the order of the terms.
+        """
+        return (tuple(sorted(terms)), instances or None)
+
+    def get_qualifier(self, instances, alias=""):
+        """
+            Returns the condition restricting a statement to the set of 
+            qualifying event numbers (instances). The set is loaded into a
+            table of the event database whenever it changes.
+        """
+        if(instances is not self.qualifying):
+            self.eventdb.set_qualifying_ids(instances)
+            self.qualifying = instances
+        return "%seventno IN (select eventno from %s)" % \
+                    (alias, self.eventdb.QUALIFYING_TABLE)
+
+    def cache_result(self, cachekey, evgroup):
+        self.query_cache.put(cachekey, evgroup, len(evgroup) + 1)
+
     def get_binstances_satisfying_state(self, stateobj, kvhash, 
                                         instances=None, 
                                         fullobjname=None,
@@ -50,7 +95,55 @@ class DataManager:
             Returns a BehaviorInstanceList of instances matching the 
             input state proposition
         """
+        statename = stateobj.get_name()        
+        terms = self.get_state_terms(stateobj, kvhash, fullobjname, mainns)
+        query = self.get_statement(statename, terms, instances)
+        params = sqlutils.terms_to_params(terms)
+        if __debug__: 
+            self.logger.info("Converted state hash %s to query %s %s" % \
+                                (kvhash, query, params))
+        
+        cachekey = self.get_cache_key(terms, instances)
         
+        #Retrieve instances matching this query from the cache 
+        ret_instances = self.query_cache.get(cachekey)
+        if(ret_instances is not None):
+            egroup = ret_instances.get_contents()
+
+            # Cached events are shared as long as they were fetched for 
+            # the same state. Otherwise the events are rebound to the state 
+            # sharing their rows and times. The rebound events are cached
+            # by state next to the events as fetched which stay in place.
+            if(egroup and (egroup[0].get_behavior() is not stateobj)):
+                viewkey = (cachekey, stateobj)
+                ret_instances = self.query_cache.get(viewkey)
+                if(ret_instances is None):
+                    ret_instances = EventGroup([r.rebind(stateobj)
+                                                for r in egroup],
+                                               bobject=stateobj)
+                    self.cache_result(viewkey, ret_instances)
+            if __debug__: 
+                self.logger.fine("Query found in cache: Number instances: %d Query: %s %s" % \
+                          (len(ret_instances), query, params))
+        else:
+            ret_instances = self.get_binstances_matching_query(query, stateobj,
+                                                               terms, 
+                                                               instances,
+                                                               params)
+            # Cache the returned instances overwriting the existing contents
+            self.cache_result(cachekey, ret_instances)
+            
+        if __debug__: 
+            self.logger.debug("Instances matching state (from eventdb): %s %s \n %s" %\
+                              (query, params, ret_instances))    
+        return ret_instances
+
+    def get_state_terms(self, stateobj, kvhash, fullobjname=None,
+                        mainns=None):
+        """
+            Returns the terms of the query for the state proposition
+            updated with the values given by the top-level model (mainns)
+        """
         # Always better to operate on a copy of the hash since 
         # the kvhash (expression hash) is linked in the the global
         # symbol table
@@ -86,56 +179,151 @@ class DataManager:
         if __debug__: 
             self.logger.info("Modified hash according to context: %s" % \
                                 (newkvhash))
-        query = sqlutils.attrhash_to_sql(newkvhash, 
-                                         statename, 
-                                         self.globalsyms,
-                                         fullobjname)
-        if __debug__: 
-            self.logger.info("Converted state hash %s to query %s" % \
-                                (newkvhash, query))
-        
-        ret_instances = None
+        return sqlutils.attrhash_to_terms(newkvhash, 
+                                          statename, 
+                                          self.globalsyms,
+                                          fullobjname)
+
+    def prepare_state(self, stateobj, mainns=None):
+        """
+            Builds the statement of an independent state proposition (and
+            with it the index answering it) ahead of its queries, e.g.
+            before forking worker processes which can not build indexes.
+        """
+        kvhash = self.globalsyms.get_symbol(stateobj.get_namespace(),
+                                            stateobj.get_name(), None)
+        if kvhash:
+            terms = self.get_state_terms(stateobj, kvhash,
+                                         stateobj.get_fullname(), mainns)
+            self.get_statement(stateobj.get_name(), terms)
+
+    def get_binstances_satisfying_bindings(self, stateobj, kvhashes,
+                                           instances=None,
+                                           fullobjname=None):
+        """
+            Answers the state proposition for a list of resolved bindings 
+            (kvhashes) together instead of with a query per binding. 
+            Returns a list holding an EventGroup for every binding answered 
+            together and None for the bindings which should be answered by 
+            get_binstances_satisfying_state() (already cached, repeated or 
+            not using equality terms).
+
+            Bindings of the same shape are matched with lookups into a hash 
+            index of the candidate events when there are many of them and 
+            with one join against the event tables otherwise.
+        """
+        results = [None] * len(kvhashes)
+        if(self.columnstore):
+            return results
+
+        statename = stateobj.get_name()
+        batches = {}
+        seen = {}
+        for (pos, kvhash) in enumerate(kvhashes):
+            terms = sqlutils.attrhash_to_terms(kvhash.copy(), 
+                                               statename, 
+                                               self.globalsyms,
+                                               fullobjname)
+            params = sqlutils.terms_to_params(terms)
+            cachekey = self.get_cache_key(terms, instances)
+            if((cachekey in self.query_cache) or (cachekey in seen)):
+                continue
+            seen[cachekey] = True
+            # Only equality terms are batched. Distinct bindings of such 
+            # terms match disjoint events which keeps the result of the 
+            # join as large as the events it returns.
+            if [op for (k, op, v) in terms if op not in (None, '=', '==')]:
+                continue
+            join = sqlutils.terms_to_join(terms)
+            if((join is None) or (not params)):
+                continue
+            if(instances):
+                join = "%s and %s" % (self.get_qualifier(instances, "e."),
+                                      join)
+            batches.setdefault(join, []).append((pos, cachekey, terms))
+
+        for (join, bindings) in batches.iteritems():
+            if(len(bindings) < 2):
+                continue
+            if(len(bindings) >= self.HASH_INDEX_MIN_BINDINGS):
+                (index, varying) = self.get_hash_index(statename,
+                                    [terms for (pos, k, terms) in bindings],
+                                    instances)
+                if __debug__: 
+                    self.logger.info("Matching %d bindings of %s on %s" % \
+                                     (len(bindings), statename, index.attrs))
+                evgroups = [index.lookup([terms[i][2] for i in varying], 
+                                         stateobj)
+                            for (pos, k, terms) in bindings]
+            else:
+                if __debug__: 
+                    self.logger.info("Answering %d bindings of %s with %s" % \
+                                     (len(bindings), statename, join))
+                evgroups = self.eventdb.get_events_for_bindings(join,
+                            [sqlutils.terms_to_params(terms) 
+                             for (pos, k, terms) in bindings],
+                            stateobj)
+            for ((pos, cachekey, terms), evgroup) in zip(bindings, evgroups):
+                self.cache_result(cachekey, evgroup)
+                results[pos] = evgroup
+        return results
+
+    def get_hash_index(self, statename, termslist, instances=None):
+        """
+            Returns an EventHashIndex over the events matching the terms 
+            having the same value in all bindings (termslist), keyed on the
+            attributes of the remaining terms, along with the positions of
+            the remaining terms. 
+        """
+        first = termslist[0]
+        varying = [i for i in range(len(first)) 
+                   if len(set([terms[i][2] for terms in termslist])) > 1]
+        fixed = [first[i] for i in range(len(first)) if i not in varying]
+        if not fixed:
+            fixed = [("1=1", None, None)]
+        query = self.get_statement(statename, fixed, instances)
+        params = sqlutils.terms_to_params(fixed)
+        attrs = tuple([first[i][0] for i in varying])
+
+        indexkey = ("hashindex", query, params, attrs)
+        index = self.query_cache.get(indexkey)
+        if(index is None):
+            index = EventHashIndex(self.eventdb, attrs,
+                                   self.eventdb.get_rows(query, params))
+            self.query_cache.put(indexkey, index, index.numrows + 1)
+        return (index, varying)
+
+    def get_statement(self, statename, terms, instances=None):
+        """
+            Returns the WHERE clause of the statement for the terms with 
+            placeholders for the values. Templates are built once per state 
+            and shape (attributes and operators) of the terms.
+        """
+        shape = (statename, sqlutils.get_terms_shape(terms))
+        template = self.statement_cache.get(shape)
+        if(template is None):
+            template = sqlutils.terms_to_template(terms)
+            self.statement_cache[shape] = template
+            if(self.columnstore is None):
+                self.eventdb.ensure_indexes(terms)
         if(instances):
             # Having "eventno IN (*)" at the beginning of the query
             # ensures efficient usage of the INDEX. 
             # Read  http://www.sqlite.org/optoverview.html (Index usage 
             # examples) to understand the rationale
-            query = "eventno IN (%s) and %s" % (instances,query)
-        
-        #Retrieve instances matching this query from the cache 
-        if(query in self.query_cache):
-            ret_instances = self.query_cache[query]
-            egroup = ret_instances.get_contents()
-            newegroup = EventGroup(bobject=stateobj)
-            
-            # FIXME: THis is highly inefficient. This is being done just
-            # to set the correct behavior object on cached instances.
-            # See if it is possible to remove the behavior pointer from 
-            # Event and shift it elsewhere.
-            for r in egroup:
-                if(isinstance(r,Event)):
-                    newr = Event(r.get_id(), avhash=r.get_avhash())
-                    newr.set_behavior(stateobj)
-                    newegroup.add(newr)
-                else:
-                    raise Exception("UNEXPECTED type of instance encountered while fetching events from cache!")
-
-            ret_instances = newegroup
-            if __debug__: 
-                self.logger.fine("Query found in cache: Number instances: %d Query: %s" % \
-                          (len(ret_instances), query))
-        else:
-            ret_instances = self.get_binstances_matching_query(query, stateobj)
-            # Cache the returned instances overwriting the existing contents
-            self.query_cache[query] = ret_instances
-            
-        if __debug__: 
-            self.logger.debug("Instances matching state (from eventdb): "\
-                                + query + " \n " + str(ret_instances))    
-        return ret_instances
+            return "%s and %s" % (self.get_qualifier(instances), template)
+        return template
     
-    def get_binstances_matching_query(self, query, stateobj):
-        return self.eventdb.get_events(query, stateobj)
+    def get_binstances_matching_query(self, query, stateobj, terms=None,
+                                      instances=None, params=()):
+        if(self.columnstore and (terms is not None)):
+            try:
+                return self.columnstore.get_events(terms, instances, stateobj)
+            except UnsupportedQueryError as e:
+                if __debug__: 
+                    self.logger.info("Columnar engine cannot answer %s (%s)" %\
+                                     (query, e))
+        return self.eventdb.get_events(query, stateobj, params)
     
     def get_event(self, id):
         return self.eventdb.get_event(id)
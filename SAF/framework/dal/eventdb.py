@@ -30,9 +30,14 @@ import time
 # Local Imports
 import framework.common.log
 from framework.objects.event import Event
+from framework.objects.timeobject import Time
 from framework.common.errordefs import EventError
 from framework.common.utils import unique
-from framework.common.storage import SqliteStorage
+from framework.common.storage import SqliteStorage, ConnectionPool
+from framework.common.sqlutils import get_affinity
+from framework.common.lrucache import LRUCache
+from framework.dal.indexmanager import IndexManager
+from framework.dal.statscatalog import StatsCatalog
 from framework.objects.eventgroup import EventGroup
 from framework.common.utils import h1, h2, h3
 
@@ -43,6 +48,14 @@ class EventDatabase(SqliteStorage):
     """
     MAX_CACHE_SIZE = 100000
     PREFETCH_SIZE = 20000
+    # Temporary table holding the event numbers qualifying state queries
+    QUALIFYING_TABLE = "temp.saf_qualifying"
+    # Table recording the indexes built by the IndexManager
+    INDEX_TABLE = "saf_indexes"
+    # Table holding the statistics of the event tables
+    STATS_TABLE = "saf_stats"
+    INTERNAL_TABLES = SqliteStorage.INTERNAL_TABLES + [INDEX_TABLE,
+                                                        STATS_TABLE]
 
     def __init__(self, dbtype, dbname, logger):
         self.dbtye = dbtype
@@ -57,14 +70,19 @@ class EventDatabase(SqliteStorage):
         self.datasize = 0;
         self.activetables = [];
         self.attributehash = {}
-        self.recordcache = {}
-
-        self.hitcount = 0
-        self.misscount = 0
+        # Rows of the event tables indexed by (table id, eventno)
+        self.recordcache = LRUCache(self.MAX_CACHE_SIZE)
+        self.tableids = {}
+        # Widths of the temporary tables created for batched bindings
+        self.bindingtables = set()
+        self.qualifyingtable = False
+        self.indexmanager = None
+        self.catalog = None
+        self.pool = None
         
         if(dbtype == "sqlite3"):
             if __debug__: self.logger.info("Connecting to database " + dbname)
-            SqliteStorage.__init__(self, self.dbname, self.logger, pragmas=True)
+            SqliteStorage.__init__(self, self.dbname, self.logger, profile='events')
             self._init_caches_()
 
             self.numrecords = self.get_data_size()
@@ -78,32 +96,97 @@ class EventDatabase(SqliteStorage):
             self.originlist = self.get_origins()
             if __debug__: self.logger.info("Origins:" + str(self.originlist))
 
-            for ev in self.eventlist:
-                attrs = self.get_attribute_names(ev);
-                for at in attrs:
-                    sqlcmd_ind_1 = """create index  ind_%s_%s on %s(%s)"""
-                    if __debug__: self.logger.info("Building index: " \
-                                 + sqlcmd_ind_1 % (ev, at, ev, at))
-                    (ret, status) = \
-                            self.execute_sql(sqlcmd_ind_1 % (ev, at, ev, at))
-                    if status == 2:
-                        if __debug__: self.logger.info("Return with status 2")
-   
+            self.indexmanager = IndexManager(self, self.INDEX_TABLE, 
+                                             self.logger)
+            self.indexmanager.ensure_base_indexes(self.eventlist)
 
     def _init_caches_ (self):
+        self.catalog = StatsCatalog(self, self.STATS_TABLE, self.logger)
         query = "select name from sqlite_master where type='table'"
         (val, status) = self.execute_sql(query)
         self.tablespresent = val
         self.datasize = 0;
         for table in self.tablespresent:
-            query = "select count(*) from %s" % (table)
-            (val, status) = self.execute_sql(query)
-            if(val[0] > 0):
-                self.datasize += val[0]
+            if(table in self.INTERNAL_TABLES):
+                continue
+            numrows = self.catalog.get_stats(table)['numrows']
+            if(numrows > 0):
+                self.datasize += numrows
                 self.activetables.append(table)
                 self.attributehash[table] = self.get_attribute_names(table)
-                if((val[0] / 2) < self.MAX_CACHE_SIZE):
-                    self.greedy_prefetch(table, val[0] / 2)
+                if((numrows / 2) < self.MAX_CACHE_SIZE):
+                    self.greedy_prefetch(table, numrows / 2)
+
+    def reconnect(self, readonly=False):
+        """
+            Opens a new connection for a worker process. A read-only
+            connection is checked out of the connection pool of the process.
+            The temporary tables belong to the old connection and are
+            created again on first use. Over a read-only connection no
+            indexes are built and no statistics are stored.
+        """
+        # Connections in the pool of the parent process must not be used
+        # by a forked process
+        self.pool = None
+        conn = None
+        if readonly:
+            try:
+                conn = self.get_connection_pool(1).checkout()
+            except Exception as e:
+                if __debug__:
+                    self.logger.info("No pooled connection to %s: %s" % \
+                                     (self.dbname, e))
+        if(conn is not None):
+            self.set_connection(conn, readonly=True)
+        else:
+            SqliteStorage.reconnect(self, readonly)
+        self.bindingtables = set()
+        self.qualifyingtable = False
+        if self.readonly:
+            if self.indexmanager:
+                self.indexmanager.enabled = False
+            if self.catalog:
+                self.catalog.writable = False
+
+    def close(self):
+        """ Closes the connection pool and the connection to the database """
+        if(self.pool is not None):
+            self.pool.close()
+            self.pool = None
+        SqliteStorage.close(self)
+
+    def get_connection_pool(self, size):
+        """
+            Returns the pool of read-only connections to the database for 
+            worker threads, opening one of the given size on first use
+        """
+        if(self.pool is None):
+            self.pool = ConnectionPool(self.dbname, size, self.logger)
+        return self.pool
+
+    def ensure_indexes(self, terms):
+        """
+            Builds the index answering the terms of a state query over the
+            active tables unless it was built before
+        """
+        if(self.indexmanager):
+            self.indexmanager.ensure_term_indexes(self.activetables, terms)
+
+    def get_missing_indexes(self):
+        """
+            Returns the (table, columns) of the indexes needed by state
+            queries which could not be built (e.g. over a read-only
+            connection)
+        """
+        if(self.indexmanager):
+            return sorted(self.indexmanager.missing)
+        return []
+
+    def add_indexes(self, indexes):
+        """ Builds the indexes given as (table, columns) unless built before """
+        if(self.indexmanager):
+            for (table, columns) in indexes:
+                self.indexmanager.ensure_index(table, columns)
 
     def get_active_tables(self):
         return self.activetables
@@ -140,9 +223,7 @@ class EventDatabase(SqliteStorage):
         eventlist = []
         for table in self.tablespresent:
             if(table not in self.INTERNAL_TABLES):            
-                query = "select count(*) from %s" % (table)
-                (val, status) = self.execute_sql(query)
-                if(val[0] > 0):
+                if(self.catalog.get_stats(table)['numrows'] > 0):
                     eventlist.append(table)
         return eventlist
 
@@ -163,32 +244,50 @@ class EventDatabase(SqliteStorage):
         if(self.datasize is not None):
             return self.datasize
 
+    def get_time_range(self):
+        """
+            Returns the times (in usecs) of the first and last events of 
+            the active tables or None if there are no events
+        """
+        first = last = None
+        for table in self.activetables:
+            stats = self.catalog.get_stats(table)
+            (tmin, tmax) = (stats['firsttime'], stats['lasttime'])
+            if(tmin is None):
+                continue
+            if((first is None) or (tmin < first)):
+                first = tmin
+            if((last is None) or (tmax > last)):
+                last = tmax
+        if(first is None):
+            return None
+        return (first, last)
+
     def greedy_prefetch(self, tablename, size):
         prefetch_query = "select * from %s limit %d"\
                  % (tablename, size)
         (recordlist, status) = \
         self.execute_sql_returnall(prefetch_query)
 
-        # Clear the recordcache with all keys with prefix tablename
-        if(len(self.recordcache) >= self.MAX_CACHE_SIZE):
-            self.recordcache.clear()
         if(recordlist):
-            attrlist = self.attributehash.get(tablename)
+            tableid = self.get_table_id(tablename)
             for rtuple in recordlist:
-                self.recordcache["%s-%s" % (tablename, rtuple[0])] = rtuple
+                self.recordcache.put((tableid, rtuple[0]), rtuple)
 
     def get_origins(self):
         originlist = []
         for table in self.activetables:
-            query = "select distinct origin from " + table
-            (val, status) = self.execute_sql(query)
-            if(val):
-                originlist.extend(val)
+            originlist.extend(self.catalog.get_stats(table)['origins'])
         return (unique(originlist))
 
     
     def get_cache_stats(self):
-        return (self.hitcount, self.misscount)
+        """ Returns the hits, misses and evictions of the record cache """
+        return self.recordcache.get_stats()
+
+    def get_table_id(self, tablename):
+        """ Returns the integer identifying a table in the record cache """
+        return self.tableids.setdefault(tablename, len(self.tableids))
     
 
     def get_event(self, eid, table=None):
@@ -223,38 +322,127 @@ class EventDatabase(SqliteStorage):
             return None
 
 
-    def get_events(self, query, stateobj):
+    def get_events(self, query, stateobj, params=()):
         """
             Executes input query and returns an EventGroup containing 
-            Event objects sorted in ascending order of time.
+            Event objects sorted in ascending order of time. params are 
+            the values bound to the '?' placeholders of the query.
         """
         evgroup = EventGroup()
+        sqlcmd = "select * from  %s where %s"
+        for table in self.activetables:            
+            if __debug__: self.logger.debug(sqlcmd % (table, query))
+            # The rows are read in batches and each batch is freed once
+            # its events are added
+            for rows in self.iter_sql(sqlcmd % (table, query), params):
+                self.add_events(table, rows, stateobj, evgroup)
+        return evgroup
 
+    def get_rows(self, query, params=()):
+        """
+            Executes input query over the active tables and returns a list
+            of (table, rows) for the tables having matching rows.
+        """
+        tablerows = []
         sqlcmd = "select * from  %s where %s"
         for table in self.activetables:            
             if __debug__: self.logger.debug(sqlcmd % (table, query))
-            (rows, status) = self.execute_sql_returnall(sqlcmd % (table, query))
+            (rows, status) = self.execute_sql_returnall(sqlcmd % (table, query),
+                                                        params)
             if(status == 0):
-                alist = self.get_attribute_names(table)
-                for etuple in rows:
-                    evid  = etuple[0]
-                    etype = etuple[1]
-                    vallist = list(etuple)
-                    ev = Event(evid, attrlist=alist, valuelist=vallist)
-                    ev.set_behavior(stateobj)
-                    evgroup.add(ev)
+                tablerows.append((table, rows))
+        return tablerows
+
+    def get_events_for_bindings(self, query, paramlist, stateobj):
+        """
+            Answers a query for many bindings at once. The tuples in
+            paramlist are loaded into a temporary table with a column
+            p<i> for the i-th value and query is the condition joining
+            an event table 'e' with the bindings 'b'.
+            Returns a list with an EventGroup for every binding.
+        """
+        width = len(paramlist[0])
+        bindtable = self.get_bindings_table(width)
+        self.begin_transaction()
+        self.execute_sql("delete from %s" % (bindtable))
+        self.execute_many("insert into %s values (%s)" % \
+                            (bindtable, ",".join(["?"] * (width + 1))),
+                          [(bid,) + tuple(params)
+                           for (bid, params) in enumerate(paramlist)])
+        self.commit_transaction()
+
+        evgroups = [EventGroup() for params in paramlist]
+        # CROSS JOIN keeps the bindings as the outer loop so that every
+        # binding is answered with the indexes of the event table
+        sqlcmd = "select b.bid, e.* from %s b cross join %s e where %s"
+        for table in self.activetables:
+            (rows, status) = self.execute_sql_returnall(sqlcmd % \
+                                                (bindtable, table, query))
+            if(status != 0):
+                continue
+            bindrows = {}
+            for row in rows:
+                bindrows.setdefault(row[0], []).append(row[1:])
+            for (bid, evrows) in bindrows.iteritems():
+                self.add_events(table, evrows, stateobj, evgroups[bid])
+        return evgroups
+
+    def get_bindings_table(self, width):
+        """
+            Returns the name of the temporary table holding bindings with
+            width values (created on first use)
+        """
+        bindtable = "temp.saf_bindings_%d" % (width)
+        if width not in self.bindingtables:
+            cols = "".join([", p%d" % (i) for i in range(width)])
+            self.execute_sql("create temp table if not exists %s "\
+                             "(bid integer primary key%s)" % (bindtable, cols))
+            self.bindingtables.add(width)
+        return bindtable
+
+    def set_qualifying_ids(self, idlist):
+        """
+            Replaces the event numbers in the table of qualifying events 
+            (created on first use) with the ones in idlist. idlist may be 
+            any iterable and is consumed one event number at a time.
+        """
+        if not self.qualifyingtable:
+            self.execute_sql("create temp table if not exists %s "\
+                             "(eventno integer primary key)" % \
+                             (self.QUALIFYING_TABLE))
+            self.qualifyingtable = True
+        self.begin_transaction()
+        self.execute_sql("delete from %s" % (self.QUALIFYING_TABLE))
+        self.execute_many("insert into %s values (?)" % \
+                            (self.QUALIFYING_TABLE),
+                          ((i,) for i in idlist))
+        self.commit_transaction()
+
+    def add_events(self, table, rows, stateobj, evgroup):
+        """
+            Creates Event objects for the rows of the given table and adds 
+            them to the input EventGroup.
+        """
+        alist = self.get_attribute_names(table)
+        timelist = Time.from_rows(rows, 
+                                  alist.index('timestamp'),
+                                  alist.index('timestampusec'))
+        for (etuple, etime) in zip(rows, timelist):
+            ev = Event(etuple[0], attrlist=alist, valuelist=etuple,
+                       timestamp=etime)
+            ev.set_behavior(stateobj)
+            evgroup.add(ev)
         return evgroup
 
     def prefetch_events(self, idlist, tablename, startid=None):
         if not startid:
             startid = idlist[0]
 
-        cachekey = "%s-%s" % (tablename, startid)
-        if cachekey in self.recordcache:
-            self.hitcount = self.hitcount + 1
-            return self.recordcache.get(cachekey)
-        else:
-            self.misscount += 1
+        tableid = self.get_table_id(tablename)
+        cachekey = (tableid, int(startid))
+        rtuple = self.recordcache.get(cachekey)
+        if rtuple is not None:
+            return rtuple
             
         prefetch_query = "select * from %s where eventno >= %s\
           limit %s" % (tablename, startid, self.PREFETCH_SIZE)
@@ -264,14 +452,13 @@ class EventDatabase(SqliteStorage):
         (recordlist, status) = \
             self.execute_sql_returnall(prefetch_query)
 
-        # Clear the recordcache with all keys with prefix tablename
-        if(len(self.recordcache) >= self.MAX_CACHE_SIZE):
-            self.recordcache.clear()
         if(recordlist):
-            for  rtuple in recordlist :
-                ckey = "%s-%s" % (tablename, rtuple[0])
-                self.recordcache[ckey] = rtuple
-            return self.recordcache.get(cachekey)
+            # Put the requested row last so that it is the most recently
+            # used one
+            for rtuple in reversed(recordlist):
+                self.recordcache.put((tableid, rtuple[0]), rtuple)
+            if(recordlist[0][0] == cachekey[1]):
+                return recordlist[0]
 
     def get_attribute_names(self, tablename):
         attrlist = []
@@ -282,6 +469,12 @@ class EventDatabase(SqliteStorage):
             attrlist.append(row[1])
         return attrlist
 
+    def get_attribute_affinities(self, tablename):
+        """ Returns a hash of the SQLite affinity of every attribute """
+        sqlcmd = "PRAGMA table_info(" + tablename + ");"
+        (val, status) = self.execute_sql_returnall(sqlcmd)
+        return dict([(row[1], get_affinity(row[2])) for row in val])
+
     def get_distinct_attrvalues(self, table, attr):
         query = "select distinct %s from %s" % (attr, table)
         (val, status) = self.execute_sql(query)
@@ -306,16 +499,11 @@ class EventDatabase(SqliteStorage):
     def print_timestamps(self, ev):
         timestamp_low = None
         timestamp_high = None
-        freq = self.get_attrvalue_freq(ev, "eventtype", ev)
-        query = "select timestamp from %s order by timestamp ASC, timestampusec ASC limit 1" % (ev)
-        (val, status) = self.execute_sql(query)
-        if(val[0] > 0):
-            timestamp_low = val[0]
-            
-        query = "select timestamp from %s order by timestamp DESC, timestampusec DESC limit 1" % (ev)
-        (val, status) = self.execute_sql(query)
-        if(val[0] > 0):
-            timestamp_high = val[0]
+        stats = self.catalog.get_stats(ev)
+        freq = stats['eventcount']
+        if(stats['firsttime'] is not None):
+            timestamp_low = stats['firsttime'] / 1000000
+            timestamp_high = stats['lasttime'] / 1000000
 
         if(timestamp_low and timestamp_high):            
             print ("\t%s - %s events [ %s (%s) to %s (%s) ] " %\
@@ -343,16 +531,25 @@ class EventDatabase(SqliteStorage):
                        'origin']
         for ev in self.eventlist:
              attrs = self.get_attribute_names(ev);
+             counts = self.catalog.get_distinct_counts(ev)
              print("\tEvent: %s" % (ev))
              for attr in attrs:
                  if(attr not in ignore_list):                
-                     attrvalues = self.get_distinct_attrvalues(ev, attr)
-                     print("\t\t%s : %s " % (attr, len(attrvalues)))
+                     print("\t\t%s : %s " % (attr, counts[attr]))
 
         self.originlist = self.get_origins()
         
         h2("Event Origins")
         print("\t%s" % " ".join(self.originlist))
 
+        h2("Record Cache")
+        self.show_cache_stats()
+
+    def show_cache_stats(self):
+        print("\t%d of %d records cached" % (len(self.recordcache),
+                                             self.recordcache.maxsize))
+        print("\tHits: %d Misses: %d Evictions: %d" % \
+                                             (self.get_cache_stats()))
+
 
 
@@ -0,0 +1,83 @@
+# hashindex.py - In-memory hash index over event tables for matching
+#                equality bindings
+#
+# Copyright (C) 2011 University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms are permitted
+# provided that the above copyright notice and this paragraph are
+# duplicated in all such forms and that any documentation, advertising
+# materials, and other materials related to such distribution and use
+# acknowledge that the software was developed by the University of
+# Southern California, Information Sciences Institute.  The name of the
+# University may not be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED "AS IS" AND WITHOUT ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, WITHOUT LIMITATION, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+# Author: Arun Viswanathan (aviswana@usc.edu)
+#------------------------------------------------------------------------------
+
+# Local Imports
+from framework.objects.eventgroup import EventGroup
+from framework.common.sqlutils import apply_affinity
+
+
+class EventHashIndex:
+    """
+        Hash index over rows of the event tables keyed on the values of a
+        tuple of attributes. Every bucket holds its rows sorted by time so
+        that events are added to an EventGroup in order.
+
+        Lookups compare values the way SQLite compares a bound text with a
+        column, i.e. the text is converted to a number for columns with
+        numeric affinity and NULLs never match.
+    """
+
+    def __init__(self, eventdb, attrs, tablerows):
+        """
+            tablerows is the list of (table, rows) returned by
+            EventDatabase.get_rows()
+        """
+        self.eventdb = eventdb
+        self.attrs = attrs
+        self.tables = []
+        # Number of rows held by the buckets
+        self.numrows = 0
+        for (table, rows) in tablerows:
+            alist = eventdb.get_attribute_names(table)
+            if [a for a in attrs if a not in alist]:
+                # A query over a table without the attribute fails and
+                # the table contributes no events
+                continue
+            affinities = eventdb.get_attribute_affinities(table)
+            positions = [alist.index(a) for a in attrs]
+            tpos = alist.index('timestamp')
+            upos = alist.index('timestampusec')
+
+            buckets = {}
+            for row in sorted(rows, key=lambda r: (r[tpos], r[upos], r[0])):
+                key = tuple([row[p] for p in positions])
+                if None in key:
+                    continue
+                buckets.setdefault(key, []).append(row)
+                self.numrows += 1
+            self.tables.append((table,
+                                [affinities[a] for a in attrs],
+                                buckets))
+
+    def lookup(self, values, stateobj):
+        """
+            Returns an EventGroup of the events whose attributes are equal
+            to the input text values
+        """
+        evgroup = EventGroup()
+        for (table, affinities, buckets) in self.tables:
+            key = tuple([apply_affinity(v, a)
+                         for (v, a) in zip(values, affinities)])
+            rows = buckets.get(key)
+            if rows:
+                self.eventdb.add_events(table, rows, stateobj, evgroup)
+        return evgroup
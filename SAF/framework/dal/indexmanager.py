@@ -0,0 +1,170 @@
+# indexmanager.py - Creates the indexes of the event tables needed by the
+#                   queries of a model and records them in the database
+#
+# Copyright (C) 2011 University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms are permitted
+# provided that the above copyright notice and this paragraph are
+# duplicated in all such forms and that any documentation, advertising
+# materials, and other materials related to such distribution and use
+# acknowledge that the software was developed by the University of
+# Southern California, Information Sciences Institute.  The name of the
+# University may not be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED "AS IS" AND WITHOUT ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, WITHOUT LIMITATION, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+# Author: Arun Viswanathan (aviswana@usc.edu)
+#------------------------------------------------------------------------------
+
+# Operators of the terms which can be answered with an index
+EQUALITY_OPS = ('=', '==')
+RANGE_OPS = ('<', '<=', '>', '>=')
+
+
+class IndexManager:
+    """
+        Creates indexes over the event tables when a query first needs them
+        instead of indexing every attribute. The indexes are recorded in a
+        metadata table of the event database so that later runs only read
+        the metadata.
+
+        The first time the metadata table is created, the indexes already
+        present in the database (e.g. built by earlier versions) are
+        recorded as well so that they are not built again.
+
+        Indexes needed while disabled (e.g. over the read-only connection
+        of a worker process) are kept as missing so that they can be built
+        later over a writable connection.
+    """
+    # Columns indexed on every event table. Qualifying events are selected
+    # by their eventno and the events are ordered by time.
+    BASE_INDEXES = [('eventno',), ('timestamp',)]
+    # Wider indexes cost nearly as much as the table to build and store
+    MAX_INDEX_COLUMNS = 4
+
+    def __init__(self, eventdb, metatable, logger):
+        self.eventdb = eventdb
+        self.metatable = metatable
+        self.logger = logger
+        # Columns of the indexes of every table
+        self.indexes = {}
+        # (table, columns) of the indexes needed while disabled
+        self.missing = set()
+        self.enabled = self.load()
+
+    def load(self):
+        """
+            Reads the recorded indexes. Returns False if the metadata table
+            can not be created (e.g. read-only database) in which case no
+            indexes are created.
+        """
+        (val, status) = self.eventdb.execute_sql_returnall(
+                            "select name from sqlite_master where "
+                            "type='table' and name='%s'" % (self.metatable))
+        if(status == 0):
+            (rows, status) = self.eventdb.execute_sql_returnall(
+                            "select tablename, columns from %s" %
+                            (self.metatable))
+            for (table, columns) in (rows or []):
+                self.add(table, tuple(columns.split(",")))
+            return True
+
+        (val, status) = self.eventdb.execute_sql(
+                            "create table %s (name text primary key, "
+                            "tablename text, columns text)" % (self.metatable))
+        if(status not in (0, 4)):
+            if __debug__:
+                self.logger.info("Indexes will not be created. Could not "
+                                 "create table %s" % (self.metatable))
+            return False
+        for (name, table, columns) in self.get_existing_indexes():
+            self.record(name, table, columns)
+        return True
+
+    def get_existing_indexes(self):
+        """ Returns the (name, table, columns) of the indexes in the database """
+        indexes = []
+        (rows, status) = self.eventdb.execute_sql_returnall(
+                            "select name, tbl_name from sqlite_master "
+                            "where type='index'")
+        for (name, table) in (rows or []):
+            (info, status) = self.eventdb.execute_sql_returnall(
+                                    "PRAGMA index_info(%s)" % (name))
+            if(info):
+                indexes.append((name, table, tuple([r[2] for r in info])))
+        return indexes
+
+    def add(self, table, columns):
+        self.indexes.setdefault(table, []).append(columns)
+
+    def record(self, name, table, columns):
+        self.add(table, columns)
+        self.eventdb.execute_sql_returnall(
+                            "insert or replace into %s values (?, ?, ?)" %
+                            (self.metatable), (name, table, ",".join(columns)))
+
+    def has_index(self, table, columns):
+        """
+            Checks if an index of the table starts with the given columns
+        """
+        for indexcols in self.indexes.get(table, []):
+            if(indexcols[:len(columns)] == columns):
+                return True
+        return False
+
+    def ensure_index(self, table, columns):
+        """ Creates an index over the columns of the table if needed """
+        if(self.has_index(table, columns)):
+            return
+        if(not self.enabled):
+            self.missing.add((table, columns))
+            return
+        name = "saf_%s_%s" % (table, "_".join(columns))
+        sqlcmd = "create index if not exists %s on %s(%s)" % \
+                    (name, table, ",".join(columns))
+        if __debug__: self.logger.info("Building index: " + sqlcmd)
+        (val, status) = self.eventdb.execute_sql(sqlcmd)
+        if(status not in (0, 4)):
+            if __debug__:
+                self.logger.info("Could not build index %s (status %d)" % \
+                                 (name, status))
+            return
+        # Gives the query planner the statistics of the new index
+        self.eventdb.execute_sql("ANALYZE %s" % (name))
+        self.record(name, table, columns)
+
+    def ensure_base_indexes(self, tables):
+        for table in tables:
+            for columns in self.BASE_INDEXES:
+                self.ensure_index(table, columns)
+
+    def get_term_columns(self, terms):
+        """
+            Returns the columns of an index answering the terms returned by
+            sqlutils.attrhash_to_terms(). The attributes compared for
+            equality come first followed by (at most) one attribute compared
+            with a range operator, up to MAX_INDEX_COLUMNS columns.
+        """
+        equals = set([k for (k, op, v) in terms
+                      if (op in EQUALITY_OPS) and (v is not None)])
+        ranges = sorted(set([k for (k, op, v) in terms
+                             if (op in RANGE_OPS) and (v is not None)]))
+        return tuple((sorted(equals) + ranges[:1])[:self.MAX_INDEX_COLUMNS])
+
+    def ensure_term_indexes(self, tables, terms):
+        """
+            Creates the index answering the terms over every table having
+            the attributes of the terms
+        """
+        columns = self.get_term_columns(terms)
+        if(not columns):
+            return
+        for table in tables:
+            attrs = self.eventdb.get_attribute_names(table)
+            if [c for c in columns if c not in attrs]:
+                continue
+            self.ensure_index(table, columns)
@@ -0,0 +1,187 @@
+# statscatalog.py - Statistics of the event tables kept in the event database
+#
+# Copyright (C) 2011 University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms are permitted
+# provided that the above copyright notice and this paragraph are
+# duplicated in all such forms and that any documentation, advertising
+# materials, and other materials related to such distribution and use
+# acknowledge that the software was developed by the University of
+# Southern California, Information Sciences Institute.  The name of the
+# University may not be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED "AS IS" AND WITHOUT ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, WITHOUT LIMITATION, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+# Author: Arun Viswanathan (aviswana@usc.edu)
+#------------------------------------------------------------------------------
+
+import json
+
+# Columns of the catalog holding the statistics of a table
+STATS_COLUMNS = ['numrows', 'eventcount', 'firsttime', 'lasttime', 'origins',
+                 'distinctcounts']
+# Columns holding a list or hash stored as JSON text along with its type
+JSON_COLUMNS = {'origins' : list, 'distinctcounts' : dict}
+
+
+class StatsCatalog:
+    """
+        Catalog of the statistics of every table of an event database: the
+        number of rows, the number of rows of the event type named by the
+        table, the times (in usecs) of the first and last events, the
+        origins and the number of distinct values of every attribute.
+
+        The statistics are stored in a metadata table of the event database
+        along with the largest eventno and the schema of the table at the
+        time they were computed. They are computed again when either of
+        them changes. The number of distinct values is only computed when
+        asked for.
+
+        Event databases are shared, so the origins and distinct counts are
+        stored as JSON text rather than pickles. Stored statistics which
+        can not be read as such (e.g. pickled by earlier versions) are
+        computed again.
+    """
+
+    def __init__(self, eventdb, metatable, logger):
+        self.eventdb = eventdb
+        self.metatable = metatable
+        self.logger = logger
+        # Statistics by table
+        self.stats = {}
+        self.stored = {}
+        self.schemas = {}
+        self.writable = self.load()
+
+    def load(self):
+        """
+            Reads the stored statistics. Returns False if the metadata table
+            can not be created (e.g. read-only database) in which case the
+            statistics are computed on every run.
+        """
+        (rows, status) = self.eventdb.execute_sql_returnall(
+                            "select name, sql from sqlite_master "
+                            "where type='table'")
+        self.schemas = dict(rows or [])
+        if(self.metatable not in self.schemas):
+            (val, status) = self.eventdb.execute_sql(
+                            "create table %s (tablename text primary key, "
+                            "maxeventno integer, tablesql text, %s)" % \
+                            (self.metatable, ", ".join(STATS_COLUMNS)))
+            if(status not in (0, 4)):
+                if __debug__:
+                    self.logger.info("Statistics will not be stored. Could "
+                                     "not create table %s" % (self.metatable))
+                return False
+            return True
+
+        (rows, status) = self.eventdb.execute_sql_returnall(
+                            "select tablename, maxeventno, tablesql, %s "
+                            "from %s" % (", ".join(STATS_COLUMNS),
+                                         self.metatable))
+        for row in (rows or []):
+            stats = dict(zip(STATS_COLUMNS, row[3:]))
+            try:
+                for (column, coltype) in JSON_COLUMNS.items():
+                    stats[column] = self.decode(stats[column], coltype)
+            except ValueError as e:
+                if __debug__:
+                    self.logger.info("Ignoring statistics of table %s: %s" %\
+                                     (row[0], e))
+                continue
+            self.stored[row[0]] = (row[1], row[2], stats)
+        return True
+
+    def decode(self, text, coltype):
+        """
+            Returns the value of type coltype (or None) stored as JSON text.
+            Raises ValueError for anything else.
+        """
+        if text is None:
+            return None
+        if not isinstance(text, basestring):
+            raise ValueError("Not JSON text")
+        value = json.loads(text)
+        if not isinstance(value, coltype):
+            raise ValueError("Expected JSON %s" % (coltype.__name__))
+        return value
+
+    def get_max_eventno(self, table):
+        (val, status) = self.eventdb.execute_sql(
+                            "select max(eventno) from %s" % (table))
+        if(status == 0):
+            return val[0]
+        return None
+
+    def get_stats(self, table):
+        """ Returns a hash of the statistics of the table """
+        stats = self.stats.get(table)
+        if(stats is not None):
+            return stats
+        maxeventno = self.get_max_eventno(table)
+        stored = self.stored.get(table)
+        if(stored and (stored[0] == maxeventno) and
+           (stored[1] == self.schemas.get(table))):
+            stats = stored[2]
+        else:
+            if __debug__:
+                self.logger.info("Computing statistics of table %s" % (table))
+            stats = self.compute_stats(table)
+            self.store(table, maxeventno, stats)
+        self.stats[table] = stats
+        return stats
+
+    def compute_stats(self, table):
+        stats = dict([(c, None) for c in STATS_COLUMNS])
+        (val, status) = self.eventdb.execute_sql_returnall(
+                    "select count(*), sum(eventtype = ?), "
+                    "min(timestamp * 1000000 + timestampusec), "
+                    "max(timestamp * 1000000 + timestampusec) from %s" % \
+                    (table), (table,))
+        if(status == 0):
+            (stats['numrows'], stats['eventcount'],
+             stats['firsttime'], stats['lasttime']) = val[0]
+        else:
+            # Not a table of events
+            (val, status) = self.eventdb.execute_sql(
+                    "select count(*) from %s" % (table))
+            stats['numrows'] = val[0]
+        stats['eventcount'] = stats['eventcount'] or 0
+
+        (val, status) = self.eventdb.execute_sql(
+                    "select distinct origin from %s" % (table))
+        stats['origins'] = val or []
+        return stats
+
+    def get_distinct_counts(self, table):
+        """
+            Returns a hash of the number of distinct values (including NULL)
+            of every attribute of the table
+        """
+        stats = self.get_stats(table)
+        if(stats['distinctcounts'] is None):
+            counts = {}
+            for attr in self.eventdb.get_attribute_names(table):
+                (val, status) = self.eventdb.execute_sql(
+                        "select count(*) from (select distinct %s from %s)" %\
+                        (attr, table))
+                counts[attr] = val[0]
+            stats['distinctcounts'] = counts
+            self.store(table, self.get_max_eventno(table), stats)
+        return stats['distinctcounts']
+
+    def store(self, table, maxeventno, stats):
+        if(not self.writable):
+            return
+        values = [stats[c] for c in STATS_COLUMNS]
+        for column in JSON_COLUMNS:
+            if(stats[column] is not None):
+                values[STATS_COLUMNS.index(column)] = json.dumps(stats[column])
+        self.eventdb.execute_sql_returnall(
+                "insert or replace into %s values (%s)" % \
+                (self.metatable, ",".join(["?"] * (len(STATS_COLUMNS) + 3))),
+                tuple([table, maxeventno, self.schemas.get(table)] + values))
@@ -23,7 +23,7 @@
 from timeobject import Time
 from framework.common.sorted_collection import SortedCollection
 
-class BehaviorInstance:
+class BehaviorInstance(object):
     """
         A behavior instance is defined as an event or a group of sorted 
         events matching a behavior (b). 
@@ -40,6 +40,8 @@ class BehaviorInstance:
         (c) bcount    - count of the number of objects in the instance
         (d) contents  - a pointer to an instance object (either Event or EventGroup)                       
     """
+    # Subclasses choose between __slots__ and an instance dictionary
+    __slots__ = ()
 
     def __init__(self):
         # Starttime of the behavior instance represented as a Time() object
@@ -366,6 +366,27 @@ class Behavior:
     def is_behavior_anon(self):
         return self.anonbehavior
 
+    def get_reachable_objects(self, visited=None):
+        """
+            Returns the state and behavior objects this behavior is composed
+            of along with those of its subbehaviors. The objects within a 
+            QUALIFIER are not included.
+        """
+        objects = []
+        if(visited is None):
+            visited = set()
+        if(id(self) in visited):
+            return objects
+        visited.add(id(self))
+        for obj in self.objlist:
+            if(obj.is_state_node() or obj.is_behavior_object() or 
+               obj.is_type_recursion()):
+                objects.append(obj)
+                contents = obj.get_contents()
+                if((not obj.is_qualifier()) and isinstance(contents, Behavior)):
+                    objects.extend(contents.get_reachable_objects(visited))
+        return objects
+
     def __repr__(self):
         dispelems = []
         for obj in self.objlist:
@@ -19,6 +19,54 @@
 #
 # Author: Arun Viswanathan (aviswana@usc.edu)
 #------------------------------------------------------------------------------
+import operator
+from framework.objects.timeobject import Time
+
+# Functions implementing the relational operators allowed in constraints
+RELOPS = {'='  : operator.eq, '==' : operator.eq, 
+          '!=' : operator.ne, 
+          '>'  : operator.gt, '>=' : operator.ge,
+          '<'  : operator.lt, '<=' : operator.le}
+
+
+def get_relop_function(relop):
+    """ Returns the function implementing the relational operator relop """
+    try:
+        return RELOPS[relop]
+    except KeyError:
+        raise Exception("Unsupported operator '%s' in constraint" % (relop))
+
+
+def to_number(val):
+    """ Converts a constraint value to an int or a float """
+    try:
+        return int(val)
+    except ValueError:
+        pass
+    try:
+        return float(val)
+    except ValueError:
+        raise Exception("Invalid value '%s' in constraint" % (val))
+
+
+def compile_predicate(relop, expval):
+    """ 
+        Returns a function checking 'actual <relop> expval' for a value.
+        A range (lower, upper) can be related only via '=' and is satisfied
+        when lower <= actual <= upper.
+    """
+    if(isinstance(expval, tuple)):
+        if(relop != "="):
+            raise Exception(" Constraint expression cannot be related to a range via '%s'" %(relop))
+        lower, upper = expval
+        lower = to_number(lower)
+        upper = to_number(upper)
+        return lambda actual: lower <= actual <= upper
+
+    relfunc = get_relop_function(relop)
+    value = to_number(expval)
+    return lambda actual: relfunc(actual, value)
+
 
 class ConstraintObject:
     """ Generic Class for Constraints """
@@ -33,12 +81,20 @@ class ConstraintObject:
         
         # Flag to control if constraints should be applied or only checked for
         self.apply_flag = False
+        
+        # Compiled predicates and time deltas for the constraints
+        self.predicates = {}
+        self.time_predicates = {}
+        self.timedeltas = {}
 
     def set_constraint(self, key, op, val, qual=None):
         if(key not in self.valid_constraints):
             raise SyntaxError("Unrecognized keyword '%s'"%(key))
         self.constraints[key] = (op, val, qual)
         self.default = key
+        self.predicates.pop(key, None)
+        self.time_predicates.pop(key, None)
+        self.timedeltas.pop(key, None)
 
     def set_apply_flag(self, flag):
         self.apply_flag = True 
@@ -61,6 +117,59 @@ class ConstraintObject:
                 self.constraints.get(k, (None, None, None))
         return (k, op, cval, cqual)
 
+    def get_predicate(self, key=None):
+        """
+            Returns a function checking a value against the constraint.
+            The function is compiled on first use and cached.
+        """
+        k = key or self.default
+        predicate = self.predicates.get(k)
+        if(predicate is None):
+            (k, op, cval, cqual) = self.get_constraint(k)
+            predicate = compile_predicate(op, cval)
+            self.predicates[k] = predicate
+        return predicate
+
+    def get_timedelta(self, key=None):
+        """
+            Returns the constraint value as a Time object using the 
+            constraint qualifier as the unit. 
+        """
+        k = key or self.default
+        deltatime = self.timedeltas.get(k)
+        if(deltatime is None):
+            (k, op, cval, cqual) = self.get_constraint(k)
+            deltatime = Time()
+            deltatime.set_time_from_str(cval, cqual)
+            self.timedeltas[k] = deltatime
+        return deltatime
+
+    def get_time_predicate(self, key=None):
+        """
+            Returns a function checking 
+                actual <relop> (reference + deltatime) 
+            for time values where deltatime is the constraint value.
+            If reference is not given, actual is compared to deltatime.
+            The relop and deltatime are kept as the relop and delta 
+            attributes of the function.
+        """
+        k = key or self.default
+        predicate = self.time_predicates.get(k)
+        if(predicate is None):
+            (k, op, cval, cqual) = self.get_constraint(k)
+            relfunc = get_relop_function(op)
+            deltatime = self.get_timedelta(k)
+            delta = float(deltatime)
+            def predicate(actual, reference=None):
+                if(reference is None):
+                    return relfunc(float(actual), delta)
+                return relfunc(float(actual), float(reference + deltatime))
+            # Shown by the debug messages of the operators
+            predicate.relop = op
+            predicate.delta = deltatime
+            self.time_predicates[k] = predicate
+        return predicate
+
     def __repr__(self):
         l = ['[']
         for key, val in self.constraints.items():
@@ -22,47 +22,95 @@
 from timeobject import Time
 from behaviorinstance import BehaviorInstance
 
+
+class EventSchema(object):
+    """
+        Attribute names of the rows of an event table along with the 
+        positions of the attributes. A schema is shared by all the events
+        having the same list of attributes.
+    """
+    __slots__ = ('attrlist', 'index', 'eventno', 'timestamp', 
+                 'timestampusec', 'eventtype')
+
+    def __init__(self, attrlist):
+        self.attrlist = tuple(attrlist)
+        self.index = dict((a, i) for (i, a) in enumerate(self.attrlist))
+        self.eventno = self.index['eventno']
+        self.timestamp = self.index['timestamp']
+        self.timestampusec = self.index['timestampusec']
+        self.eventtype = self.index['eventtype']
+
+SCHEMAS = {}
+
+def get_schema(attrlist):
+    """ Returns the shared schema for the list of attributes """
+    key = tuple(attrlist)
+    schema = SCHEMAS.get(key)
+    if(schema is None):
+        schema = SCHEMAS[key] = EventSchema(key)
+    return schema
+
+
 class Event(BehaviorInstance):
     """
         Represents an event in memory.
+
+        An event keeps the row of its table as a tuple along with the 
+        schema of the table. The attribute hash is built from the row only
+        when asked for and the time of the event is computed on first use.
     """
+    __slots__ = ('row', 'schema', 'timestamp', 'ptr_to_behavior',
+                 'ptr_to_dependee', 'atleast_count')
 
-    def __init__(self, eventno, attrlist=None, valuelist=None, avhash=None):
-        self.eventno = eventno
-        self.ahash = {}
-       
+    def __init__(self, eventno, attrlist=None, valuelist=None, avhash=None,
+                 timestamp=None):
         if avhash:
-            self.ahash = avhash.copy()
-        else:
-            index = 0
-            for a in attrlist:
-                v = valuelist[index]
-                self.ahash[a] = v
-                index += 1  
-        self._initialize_fields()
-       
-    def _initialize_fields(self):
-        self.eventno = self.ahash['eventno']        
-        self.timestamp_sec = self.ahash['timestamp']
-        self.timestamp_usec = self.ahash['timestampusec']
-        self.timestamp = Time(self.timestamp_sec, self.timestamp_usec)
-        self.eventtype = self.ahash['eventtype']
-        
-        # Set the variables required by BehaviorInstance
-        self.starttime = self.timestamp
-        self.endtime   = self.timestamp
-        self.bcount    = 1
-        self.contents  = self.ahash
+            attrlist = avhash.keys()
+            valuelist = avhash.values()
+        self.schema = get_schema(attrlist)
+        self.row = tuple(valuelist)
+        self.timestamp = timestamp
         self.ptr_to_behavior = None
         self.ptr_to_dependee = None
         self.atleast_count = None
 
-    def get_avhash(self):
-        return self.ahash
+    # Fields of a BehaviorInstance
+    starttime = property(lambda self: self.get_timestamp())
+    endtime = property(lambda self: self.get_timestamp())
+    contents = property(lambda self: self.get_avhash())
+    bcount = property(lambda self: 1)
 
+    @property
+    def eventno(self):
+        return self.row[self.schema.eventno]
+
+    @property
+    def eventtype(self):
+        return self.row[self.schema.eventtype]
+
+    def get_avhash(self):
+        return dict(zip(self.schema.attrlist, self.row))
 
     def get_timestamp(self):        
+        if(self.timestamp is None):
+            self.timestamp = Time(self.row[self.schema.timestamp], 
+                                  self.row[self.schema.timestampusec])
         return self.timestamp    
+
+    def get_starttime(self):
+        return self.get_timestamp()
+
+    def get_endtime(self, index=None):
+        return self.get_timestamp()
+
+    def get_contents(self):
+        return self.get_avhash()
+
+    def get_bcount(self):
+        return 1
+
+    def __len__(self):
+        return 1
   
     def get_uniqueid_str(self):
         return str(self.eventno) + "-" + self.eventtype
@@ -90,13 +138,28 @@ class Event(BehaviorInstance):
         self.ptr_to_behavior = ptr_to_behavior
 
     
+    def rebind(self, ptr_to_behavior):
+        """
+            Returns a copy of the event for another behavior object. The
+            copy shares the row, schema and time of the event.
+        """
+        ev = Event.__new__(Event)
+        ev.schema = self.schema
+        ev.row = self.row
+        ev.timestamp = self.timestamp
+        ev.ptr_to_behavior = ptr_to_behavior
+        ev.ptr_to_dependee = None
+        ev.atleast_count = None
+        return ev
+
     def add(self, ev):
         """
             Replaces the existing event fields with fields from the 
             new event.
         """
-        self.ahash = ev.get_avhash()
-        self._initialize_fields()
+        self.schema = ev.schema
+        self.row = ev.row
+        self.timestamp = ev.timestamp
 
     def __repr__(self):
         printstr = [] 
@@ -126,7 +189,9 @@ class Event(BehaviorInstance):
             the same.
         """
         if(isinstance(other, Event)):
-            return self.ahash == other.ahash
+            if(self.schema is other.schema):
+                return self.row == other.row
+            return self.get_avhash() == other.get_avhash()
         else:
             return False
         
@@ -18,27 +18,68 @@
 #
 # Author: Arun Viswanathan (aviswana@usc.edu)
 #------------------------------------------------------------------------------
-from framework.common.utils import get_timediff
 
-class Time:
+USECS_PER_SEC = 1000000
+
+
+class Time(object):
     """ 
-        Generic object to handle time 
+        Generic object to handle time. 
+        
+        The time is held as a single integer count of microseconds so that
+        comparisons and arithmetic are plain integer operations.
     """
+    __slots__ = ('usecs',)
     
     def __init__(self, sec=0, usec=0):
-        self.seconds = sec
-        self.microseconds = usec
-        self._compute_floatrepr()
+        self.usecs = sec * USECS_PER_SEC + usec
+
+    @classmethod
+    def from_usecs(cls, usecs):
+        """ Returns a Time object for the given count of microseconds """
+        t = cls.__new__(cls)
+        t.usecs = usecs
+        return t
+
+    @classmethod
+    def from_rows(cls, rows, secindex, usecindex):
+        """ 
+            Bulk constructor returning a list of Time objects for a batch of 
+            rows where secindex and usecindex are the positions of the 
+            seconds and microseconds columns in each row.
+        """
+        new = cls.__new__
+        timelist = []
+        append = timelist.append
+        for row in rows:
+            t = new(cls)
+            t.usecs = row[secindex] * USECS_PER_SEC + row[usecindex]
+            append(t)
+        return timelist
+
+    @property
+    def seconds(self):
+        return self.get_time_tuple()[0]
+
+    @property
+    def microseconds(self):
+        return self.get_time_tuple()[1]
 
-    def _compute_floatrepr(self):
-         self.floatrepr = \
-               str(self.seconds) + "." + str(self.microseconds).zfill(6)       
+    @property
+    def floatrepr(self):
+        return repr(self)
+
+    def get_usecs(self):
+        return self.usecs
     
     def get_time(self):
-        return float(self.floatrepr)
+        return self.usecs / 1000000.0
     
     def get_time_tuple(self):
-        return (self.seconds, self.microseconds)        
+        (sec, usec) = divmod(abs(self.usecs), USECS_PER_SEC)
+        if(self.usecs < 0):
+            return (-sec, -usec)
+        return (sec, usec)
 
     def set_time_from_str(self, floatstr, qualifier):
         assert(isinstance(floatstr,str))
@@ -54,94 +95,54 @@ class Time:
                 intpart = fields[0]
             else:
                 raise Exception("Invalid number %s!" %(floatstr))
-            self.seconds = int(intpart)
-            self.microseconds = int(float(str(fracpart).zfill(6)) * 1000000.0)
+            self.usecs = int(intpart) * USECS_PER_SEC + \
+                         int(float(str(fracpart).zfill(6)) * 1000000.0)
         elif(q == 'MS' or q  == 'MSEC' or q == 'MSECS'):
-            self.seconds = int(float(floatstr)/ 1000.0)
-            self.microseconds = int(float(floatstr) * 1000.0)
+            self.usecs = int(float(floatstr) * 1000.0)
         else:
             raise Exception("Invalid time qualifier (%s) found !" %(q))
-        self._compute_floatrepr()
         
     def __eq__(self, tocompare):
-        return ((self.seconds == tocompare.seconds) and
-                (self.microseconds == tocompare.microseconds))
+        if(not isinstance(tocompare, Time)):
+            return NotImplemented
+        return self.usecs == tocompare.usecs
         
     def __ne__(self, tocompare):
-        return not self.__eq__(tocompare)
+        if(not isinstance(tocompare, Time)):
+            return NotImplemented
+        return self.usecs != tocompare.usecs
     
     def __gt__(self,tocompare):
-        if(self.seconds == tocompare.seconds):
-            if(self.microseconds > tocompare.microseconds):
-                return True
-            else:
-                return False
-        elif(self.seconds > tocompare.seconds):
-            return True
-        else:
-            return False
+        return self.usecs > tocompare.usecs
             
     def __ge__(self,tocompare):
-        if(self.seconds == tocompare.seconds):
-            if(self.microseconds >= tocompare.microseconds):
-                return True
-            else:
-                return False
-        elif(self.seconds >= tocompare.seconds):
-            return True
-        else:
-            return False
+        return self.usecs >= tocompare.usecs
 
     def __lt__(self,tocompare):
-        if(self.seconds == tocompare.seconds):
-            if(self.microseconds < tocompare.microseconds):
-                return True
-            else:
-                return False
-        elif(self.seconds < tocompare.seconds):
-            return True
-        else:
-            return False
+        return self.usecs < tocompare.usecs
+
+    def __le__(self,tocompare):
+        return self.usecs <= tocompare.usecs
 
+    def __hash__(self):
+        return hash(self.usecs)
 
     def __add__(self, toadd):
-        (s1, ms1) = self.get_time_tuple()
-        (s2, ms2) = toadd.get_time_tuple()
-        
-        # Add corresponding parts from both timeobjects
-        # FIXME: Not handling overflow of seconds addition
-        sum_s = s1 + s2
-        sum_ms = ms1 + ms2
-        
-        # Overflow case for milliseconds
-        if(sum_ms >= 1000000):
-            # Increment the seconds
-            sum_s += 1
-            # Put the remainder if any in milliseconds
-            sum_ms = (sum_ms - 1000000)
-            
-        return Time(sum_s, sum_ms)
+        return Time.from_usecs(self.usecs + toadd.usecs)
 
     def __sub__(self, tosub):
-        t2 = self.get_time_tuple()
-        t1 = tosub.get_time_tuple()
-        t = get_timediff(t1, t2)
-        return Time(t.seconds, t.microseconds)
-
-
-    def __le__(self,tocompare):
-        if(self.seconds == tocompare.seconds):
-            if(self.microseconds <= tocompare.microseconds):
-                return True
-            else:
-                return False
-        elif(self.seconds <= tocompare.seconds):
-            return True
-        else:
-            return False
+        return Time.from_usecs(self.usecs - tosub.usecs)
         
     def __float__(self):
-        return float(self.floatrepr)
+        return self.usecs / 1000000.0
+
+    def __getstate__(self):
+        return (self.usecs,)
+
+    def __setstate__(self, state):
+        (self.usecs,) = state
 
     def __repr__(self):
-        return ("%s" % (self.floatrepr))
+        (sec, usec) = divmod(abs(self.usecs), USECS_PER_SEC)
+        sign = "-" if self.usecs < 0 else ""
+        return "%s%d.%06d" % (sign, sec, usec)
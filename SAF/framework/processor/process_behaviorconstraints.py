@@ -89,17 +89,24 @@ class BehaviorConstraintProcessor:
 
         try:
             if(cname == "bcount"):
-                newinstances = self.check_bcount(instances, cval, relop, cqual)
+                newinstances = self.check_bcount(instances, cval, relop, cqual,
+                                                 constraints.get_predicate())
             elif(cname == "icount"):
-                newinstances = self.check_icount(instances, cval, relop, cqual)
+                newinstances = self.check_icount(instances, cval, relop, cqual,
+                                                 constraints.get_predicate())
             elif(cname == "at"):
-                newinstances = self.check_at(instances, cval, relop, cqual)
+                newinstances = self.check_at(instances, cval, relop, cqual,
+                                             constraints.get_predicate())
             elif(cname == "end"):
-                newinstances = self.check_end(instances, cval, relop, cqual)
+                newinstances = self.check_end(instances, cval, relop, cqual,
+                                              constraints.get_predicate())
             elif(cname == "duration"):
-                newinstances = self.check_duration(instances, cval, relop, cqual)
+                newinstances = self.check_duration(instances, cval, relop, 
+                                                   cqual, 
+                                                   constraints.get_predicate())
             elif(cname == "rate"):
-                newinstances = self.check_rate(instances, cval, relop, cqual)
+                newinstances = self.check_rate(instances, cval, relop, cqual,
+                                               constraints.get_predicate())
             elif(cname == "_limit"):
                 newinstances = self.apply__limit(instances, cval, relop, cqual)
             elif(cname == "_eventno"):
@@ -114,26 +121,13 @@ class BehaviorConstraintProcessor:
         return newinstances
     
     
-    def build_constraint_expr(self, relop, expval, actualval):
-        expr = ""
-        if(isinstance(expval,tuple)):
-            lower,upper = expval
-            expr = "%s >= %s and %s <= %s" % (actualval, lower, actualval, upper)
-            if(relop != "="):
-                raise Exception(" Constraint expression cannot be related to a range via '%s'" %(relop))    
-        else:
-            if (relop == '='):
-                relop = "=="
-            expr = "%s %s %s" % (actualval, relop, expval)
-        return expr
-
-
-    def check_icount(self, instances, cval, relop, cqual):
+    def check_icount(self, instances, cval, relop, cqual, predicate):
 
-        expr = self.build_constraint_expr(relop, cval, instances.get_icount())
-        val = eval(expr)
+        icount = instances.get_icount()
+        val = predicate(icount)
         if __debug__: 
-            self.logger.debug("Check Instance Count : %s %s" % (expr, val))
+            self.logger.debug("Check Instance Count : %s %s %s %s" % \
+                              (icount, relop, cval, val))
         
         if(val):
             return instances
@@ -213,7 +207,7 @@ class BehaviorConstraintProcessor:
                     newinstlist.insert(n) 
             return newinstlist
 
-    def check_at(self, instances, cval, relop, cqual):
+    def check_at(self, instances, cval, relop, cqual, predicate):
         newinstances = BehaviorInstanceList([], 
                                             bobject=instances.get_behavior())
         utils.lprint(2, "Checking constraint 'at' over %s instances" %(len(instances)))
@@ -226,11 +220,12 @@ class BehaviorConstraintProcessor:
             insts = r.get_contents()
             dep_ptr = r.get_dependee()
             b_ptr = r.get_behavior()
+            attime = float(r.get_starttime())
          
-            expr = self.build_constraint_expr(relop, cval, attime)
-            val = eval(expr)
+            val = predicate(attime)
             if __debug__: 
-                self.logger.info("Check attime : %s %s" % (expr, val))
+                self.logger.info("Check attime : %s %s %s %s" % \
+                                 (attime, relop, cval, val))
 
             if(val):
                 updatelist = insts                
@@ -239,12 +234,12 @@ class BehaviorConstraintProcessor:
                 eg.set_dependee(dep_ptr)
                 newinstances.insert(eg)
                 utils.lprint(3, "Found an instance with at = %0.2f [%s %s]" %\
-                     (at, relop, cval))
+                     (attime, relop, cval))
                 
         return newinstances
     
     
-    def check_end(self, instances, cval, relop, cqual):
+    def check_end(self, instances, cval, relop, cqual, predicate):
         newinstances = BehaviorInstanceList([], 
                                             bobject=instances.get_behavior())
         utils.lprint(2, "Checking constraint 'end' over %s instances" %(len(instances)))
@@ -264,10 +259,10 @@ class BehaviorConstraintProcessor:
             else:
                 endtime = float(r.get_endtime())
          
-            expr = self.build_constraint_expr(relop, cval, endtime)
-            val = eval(expr)
+            val = predicate(endtime)
             if __debug__: 
-                self.logger.info("Check endtime : %s %s" % (expr, val))
+                self.logger.info("Check endtime : %s %s %s %s" % \
+                                 (endtime, relop, cval, val))
             if(val):
                 updatelist = insts                
                 eg = EventGroup(updatelist)
@@ -281,7 +276,7 @@ class BehaviorConstraintProcessor:
         return newinstances
     
     
-    def check_duration(self, instances, cval, relop, cqual):
+    def check_duration(self, instances, cval, relop, cqual, predicate):
         newinstances = BehaviorInstanceList([], 
                                             bobject=instances.get_behavior())
         utils.lprint(2, "Checking constraint 'duration' for %s instances" %(len(instances)))
@@ -301,10 +296,10 @@ class BehaviorConstraintProcessor:
             else:
                 duration = float(r.get_endtime() - r.get_starttime())
             
-            expr = self.build_constraint_expr(relop, cval, duration)
-            val = eval(expr)
+            val = predicate(duration)
             if __debug__: 
-                self.logger.info("Check duration : %s %s" % (expr, val))
+                self.logger.info("Check duration : %s %s %s %s" % \
+                                 (duration, relop, cval, val))
 
             if(val):
                 updatelist = insts                
@@ -317,7 +312,7 @@ class BehaviorConstraintProcessor:
         return newinstances
 
  
-    def check_rate(self, instances, cval, relop, cqual):
+    def check_rate(self, instances, cval, relop, cqual, predicate):
         newinstances = BehaviorInstanceList([], 
                                             bobject=instances.get_behavior())
         utils.lprint(2, "Checking constraint 'rate' for %s instances" %(len(instances)))
@@ -345,10 +340,10 @@ class BehaviorConstraintProcessor:
 
             if __debug__: 
                 self.logger.info("rate : %s (%f/%f)" % (rate, float(bcount), float(dur)))            
-            expr = self.build_constraint_expr(relop, cval, rate)
-            val = eval(expr)
+            val = predicate(rate)
             if __debug__: 
-                self.logger.info("Check rate : %s %s" % (expr, val))
+                self.logger.info("Check rate : %s %s %s %s" % \
+                                 (rate, relop, cval, val))
 
             if(val):
                 updatelist = insts                
@@ -362,7 +357,7 @@ class BehaviorConstraintProcessor:
         return newinstances
 
     
-    def check_bcount(self, instances, cval, relop, cqual):
+    def check_bcount(self, instances, cval, relop, cqual, predicate):
         newinstances = BehaviorInstanceList([], bobject=instances.get_behavior())
         utils.lprint(2, "Checking constraint 'bcount' for %s instances" %(len(instances)))
                       
@@ -375,10 +370,10 @@ class BehaviorConstraintProcessor:
             dep_ptr = r.get_dependee()
             b_ptr = r.get_behavior()
 
-            expr = self.build_constraint_expr(relop, cval, bcount)
-            val = eval(expr)
+            val = predicate(bcount)
             if __debug__: 
-                self.logger.info("Check Event Count : %s %s" % (expr, val))
+                self.logger.info("Check Event Count : %s %s %s %s" % \
+                                 (bcount, relop, cval, val))
 
             if(val):
                 updatelist = insts
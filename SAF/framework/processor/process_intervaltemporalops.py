@@ -19,9 +19,18 @@
 # Author: Arun Viswanathan (aviswana@usc.edu)
 #------------------------------------------------------------------------------
 
+from bisect import bisect_left, bisect_right
+
 import framework.common.sqlutils as sqlutils
 from framework.objects.behaviorinstancelist import BehaviorInstanceList
 from framework.objects.eventgroup import EventGroup
+from framework.objects.timeobject import Time
+from framework.common.utils import get_satisfying_ranges
+
+# Relational operator relating phi2 to phi1 for a constraint relating 
+# phi1 to phi2
+FLIPPED_RELOPS = {'=' : '==', '==' : '==', '!=' : '!=',
+                  '>' : '<', '>=' : '<=', '<' : '>', '<=' : '>='}
 
 class ITLOpsProcessor:
     """
@@ -38,6 +47,11 @@ class ITLOpsProcessor:
     def apply_concurrent_semantics(self, obj, prevobj, nextobj, deltatime, cop):
         """ Processes the olap operator and operator constraints """
 
+        # Operator constraints are compiled once per operator node
+        predicate = None
+        if(deltatime and cop):
+            predicate = obj.get_constraints().get_time_predicate()
+
         phi1_instances = prevobj.get_instances()
         phi2_instances = nextobj.get_instances()
 
@@ -57,55 +71,170 @@ class ITLOpsProcessor:
 
         # Create a new return instance list
         newinstlist = BehaviorInstanceList([], bobject=obj)
-
-        for phi1 in phi1_instances:
-            for phi2 in phi2_instances:
-                if __debug__:
-                    self.logger.debug("phi1 (%s)\nphi2 (%s) " % (phi1, phi2))
-
-                if (phi1 == phi2):
-                    continue
-
-                phi1_start = phi1.get_starttime()
-                phi1_end = phi1.get_endtime()
-                phi2_start = phi2.get_starttime()
-                phi2_end = phi2.get_endtime()
-
-                satisfied = False
-                if(obj.is_olap_op()):
-                    satisfied = \
-                    self.process_olap_op(phi1_start, phi1_end, phi2_start,
-                                            phi2_end, deltatime, cop)
-                elif(obj.is_ew_op()):
-                    satisfied = \
-                     self.process_ew_op(phi1_start, phi1_end, phi2_start,
-                                            phi2_end, deltatime, cop)
-                elif(obj.is_sw_op()):
-                    satisfied = \
-                     self.process_sw_op(phi1_start, phi1_end, phi2_start,
-                                            phi2_end, deltatime, cop)
-                elif(obj.is_dur_op()):
-                    satisfied = \
-                     self.process_dur_op(phi1_start, phi1_end, phi2_start,
-                                            phi2_end, deltatime, cop)
-                elif(obj.is_eq_op()):
-                    satisfied = \
-                     self.process_eq_op(phi1_start, phi1_end, phi2_start,
-                                            phi2_end, deltatime, cop)
-                else:
-                    raise SyntaxError("Unrecognized logical operator - %s" % \
-                                       (obj.get_name()))
-
-                if(satisfied):
-                    egrp = EventGroup(bobject=obj)
-                    egrp.add(phi1)
-                    egrp.add(phi2)
-                    newinstlist.insert(egrp)
+        if((not phi1_instances) or (not phi2_instances)):
+            return newinstlist
+
+        process_op = self.get_operator_function(obj)
+
+        # Only the candidate pairs found by sweeping over the intervals are 
+        # checked against the operator semantics. The pairs are visited in 
+        # the same order as a nested loop over phi1 and phi2 instances.
+        pairs = self.get_candidate_pairs(obj, phi1_instances, phi2_instances,
+                                         predicate, deltatime, cop)
+        for (i, j) in pairs:
+            phi1 = phi1_instances[i]
+            phi2 = phi2_instances[j]
+            if __debug__:
+                self.logger.debug("phi1 (%s)\nphi2 (%s) " % (phi1, phi2))
+
+            if (phi1 == phi2):
+                continue
+
+            satisfied = process_op(phi1.get_starttime(), phi1.get_endtime(),
+                                   phi2.get_starttime(), phi2.get_endtime(),
+                                   predicate)
+            if(satisfied):
+                egrp = EventGroup(bobject=obj)
+                egrp.add(phi1)
+                egrp.add(phi2)
+                newinstlist.insert(egrp)
         return newinstlist
 
 
+    def get_operator_function(self, obj):
+        """ Returns the function checking the semantics of the operator """
+        if(obj.is_olap_op()):
+            return self.process_olap_op
+        elif(obj.is_ew_op()):
+            return self.process_ew_op
+        elif(obj.is_sw_op()):
+            return self.process_sw_op
+        elif(obj.is_dur_op()):
+            return self.process_dur_op
+        elif(obj.is_eq_op()):
+            return self.process_eq_op
+        raise SyntaxError("Unrecognized logical operator - %s" % \
+                           (obj.get_name()))
+
+
+    def get_candidate_pairs(self, obj, phi1_instances, phi2_instances,
+                            predicate, deltatime, cop):
+        """
+            Returns the sorted list of (i, j) positions of phi1 and phi2 
+            instances which may satisfy the operator. Every returned pair 
+            still has to be checked against the operator semantics.
+        """
+        spans1 = [(p.get_starttime().get_usecs(), p.get_endtime().get_usecs())
+                  for p in phi1_instances]
+        spans2 = [(p.get_starttime().get_usecs(), p.get_endtime().get_usecs())
+                  for p in phi2_instances]
+
+        if(obj.is_olap_op()):
+            # phi2_start < phi1_start < phi2_end < phi1_end
+            pairs = self.sweep_pairs(spans1, spans2, 
+                                     lambda s1, e1: (s1, e1))
+        elif(obj.is_dur_op() and not predicate):
+            # phi2_start < phi1_start and phi1_end < phi2_end
+            pairs = self.sweep_pairs(spans1, spans2,
+                                     lambda s1, e1: (e1, None))
+        elif(obj.is_sw_op() or obj.is_ew_op()):
+            pos = 0 if obj.is_sw_op() else 1
+            if(predicate):
+                pairs = self.window_pairs(phi1_instances, phi2_instances, 
+                                          pos, deltatime, cop)
+            else:
+                pairs = self.equal_pairs([s[pos] for s in spans1],
+                                         [s[pos] for s in spans2])
+        elif(predicate):
+            # The constraint applies to the durations on either side
+            # independently
+            ok1 = [i for (i, (s, e)) in enumerate(spans1) 
+                   if predicate(Time.from_usecs(e - s))]
+            ok2 = [j for (j, (s, e)) in enumerate(spans2) 
+                   if predicate(Time.from_usecs(e - s))]
+            pairs = [(i, j) for i in ok1 for j in ok2]
+        else:
+            # Equal durations
+            pairs = self.equal_pairs([e - s for (s, e) in spans1],
+                                     [e - s for (s, e) in spans2])
+        return pairs
+
+
+    def sweep_pairs(self, spans1, spans2, endrange):
+        """
+            Sweeps over the phi1 spans in the order of their starttimes 
+            keeping the phi2 spans starting earlier sorted by their 
+            endtimes. endrange(s1, e1) returns the open interval (lo, hi) 
+            the endtime of a phi2 span has to lie within where hi of None
+            is unbounded.
+        """
+        order1 = sorted(range(len(spans1)), key=lambda i: spans1[i][0])
+        order2 = sorted(range(len(spans2)), key=lambda j: spans2[j][0])
+        numphi2 = len(order2)
+
+        ends = []
+        active = []
+        pairs = []
+        k = 0
+        for i in order1:
+            (s1, e1) = spans1[i]
+            while((k < numphi2) and (spans2[order2[k]][0] < s1)):
+                j = order2[k]
+                pos = bisect_right(ends, spans2[j][1])
+                ends.insert(pos, spans2[j][1])
+                active.insert(pos, j)
+                k += 1
+            (lo, hi) = endrange(s1, e1)
+            first = bisect_right(ends, lo)
+            last = len(ends) if hi is None else bisect_left(ends, hi)
+            pairs.extend([(i, j) for j in active[first:last]])
+        pairs.sort()
+        return pairs
+
+
+    def equal_pairs(self, keys1, keys2):
+        """ Returns the pairs of positions having equal keys """
+        buckets = {}
+        for (j, key) in enumerate(keys2):
+            buckets.setdefault(key, []).append(j)
+        pairs = []
+        for (i, key) in enumerate(keys1):
+            for j in buckets.get(key, []):
+                pairs.append((i, j))
+        return pairs
+
+
+    def window_pairs(self, phi1_instances, phi2_instances, pos, deltatime, cop):
+        """
+            Returns the pairs satisfying 
+                phi1_time <relop> (phi2_time + deltatime) 
+            where the times are the starttimes (pos 0) or endtimes (pos 1) by
+            searching the phi2 times shifted by deltatime in sorted order
+        """
+        relop = FLIPPED_RELOPS.get(cop)
+        if(relop is None):
+            return [(i, j) for i in range(len(phi1_instances))
+                           for j in range(len(phi2_instances))]
+
+        gettime = [lambda p: p.get_starttime(), lambda p: p.get_endtime()][pos]
+        shifted = sorted([(float(gettime(p) + deltatime), j) 
+                          for (j, p) in enumerate(phi2_instances)])
+        keys = [key for (key, j) in shifted]
+        order = [j for (key, j) in shifted]
+
+        pairs = []
+        for (i, phi1) in enumerate(phi1_instances):
+            t1 = float(gettime(phi1))
+            matched = []
+            for (lo, hi) in get_satisfying_ranges(keys, relop, t1):
+                matched.extend(order[lo:hi])
+            matched.sort()
+            pairs.extend([(i, j) for j in matched])
+        return pairs
+
+
     def process_olap_op(self, phi1_start, phi1_end, phi2_start, phi2_end, 
-                                                        deltatime, cop):
+                                                        predicate):
         """ 
             Processes the olap operator and operator constraints
             
@@ -126,25 +255,21 @@ class ITLOpsProcessor:
         else:
             return False
 
-        if(deltatime and cop):
-            if(cop == "="): cop = "=="
-            eval_expr = "%s %s %s" % (phi2_end,
-                                      cop,
-                                      (phi1_start + deltatime))
-            
-            satisfied = True if eval(eval_expr) else False
+        if(predicate):
+            satisfied = predicate(phi2_end, phi1_start)
                                 
             if __debug__:
                 satstr = "not" if not satisfied else "" 
                 self.logger.info(\
-                    "Eval expression %s satisfied %s by %s <-> %s" % \
-                    (eval_expr, satstr, phi1, phi2))
+                    "olap constraint %s %s (%s + %s) %s satisfied" % \
+                    (phi2_end, predicate.relop, phi1_start, predicate.delta, 
+                     satstr))
         
         return satisfied
 
 
     def process_sw_op(self, phi1_start, phi1_end, phi2_start, phi2_end, 
-                                                        deltatime, cop):
+                                                        predicate):
         """ 
             Processes the sw operator and operator constraints
             
@@ -156,18 +281,15 @@ class ITLOpsProcessor:
         """
                
         satisfied = False
-        if(deltatime and cop):
-            if(cop == "="): cop = "=="
-            eval_expr = "%s %s %s" % (phi1_start,
-                                      cop,
-                                      (phi2_start + deltatime))
-            satisfied = True if eval(eval_expr) else False    
+        if(predicate):
+            satisfied = predicate(phi1_start, phi2_start)
             
             if __debug__:
                 satstr = "not" if not satisfied else "" 
                 self.logger.info(\
-                    "Eval expression %s satisfied %s by %s <-> %s" % \
-                    (eval_expr, satstr, phi1, phi2))
+                    "sw constraint %s %s (%s + %s) %s satisfied" % \
+                    (phi1_start, predicate.relop, phi2_start, predicate.delta, 
+                     satstr))
         else:
             if ((phi2_start == phi1_start)):
                satisfied = True
@@ -176,7 +298,7 @@ class ITLOpsProcessor:
 
 
     def process_ew_op(self, phi1_start, phi1_end, phi2_start, phi2_end, 
-                                                        deltatime, cop):
+                                                        predicate):
         """ 
             Processes the ew operator and operator constraints
             
@@ -187,18 +309,15 @@ class ITLOpsProcessor:
                 phi1_end  <relop> (phi2_end + deltatime)
         """        
         satisfied = False
-        if(deltatime and cop):
-            if(cop == "="): cop = "=="
-            eval_expr = "%s %s %s" % (phi1_end,
-                                      cop,
-                                      (phi2_end + deltatime))
-            satisfied = True if eval(eval_expr) else False    
+        if(predicate):
+            satisfied = predicate(phi1_end, phi2_end)
             
             if __debug__:
                 satstr = "not" if not satisfied else "" 
                 self.logger.info(\
-                    "Eval expression %s satisfied %s by %s <-> %s" % \
-                    (eval_expr, satstr, phi1, phi2))
+                    "ew constraint %s %s (%s + %s) %s satisfied" % \
+                    (phi1_end, predicate.relop, phi2_end, predicate.delta, 
+                     satstr))
         else:
             if ((phi2_end== phi1_end)):
                satisfied = True
@@ -207,7 +326,7 @@ class ITLOpsProcessor:
 
 
     def process_eq_op(self, phi1_start, phi1_end, phi2_start, phi2_end, 
-                      deltatime, cop):
+                      predicate):
         """ 
             Processes the eq operator and operator constraints
             
@@ -221,20 +340,15 @@ class ITLOpsProcessor:
         phi1_duration = (phi1_end - phi1_start)
         phi2_duration = (phi2_end - phi2_start)
         satisfied = False
-        if(deltatime and cop):
-            if(cop == "="): cop = "=="
-            
-            eval_expr = "(%s %s %s) and (%s %s %s)" % \
-                (phi1_duration, cop, deltatime,
-                 phi2_duration, cop, deltatime)
-             
-            satisfied = True if eval(eval_expr) else False   
+        if(predicate):
+            satisfied = predicate(phi1_duration) and predicate(phi2_duration)
 
             if __debug__:
                 satstr = "not" if not satisfied else "" 
                 self.logger.info(\
-                    "Eval expression %s satisfied %s by %s <-> %s" % \
-                    (eval_expr, satstr, phi1, phi2))
+                    "eq constraint on durations %s, %s %s %s %s satisfied" % \
+                    (phi1_duration, phi2_duration, predicate.relop, 
+                     predicate.delta, satstr))
         else:
             if ((phi2_duration == phi1_duration)):
                satisfied = True
@@ -243,7 +357,7 @@ class ITLOpsProcessor:
 
 
     def process_dur_op(self, phi1_start, phi1_end, phi2_start, phi2_end, 
-                                                        deltatime, cop):
+                                                        predicate):
         """ 
             Processes the dur operator and operator constraints
             
@@ -254,20 +368,17 @@ class ITLOpsProcessor:
                 phi1_end  <relop> (phi2_end + deltatime)
         """
         satisfied = False
-        if(deltatime and cop):
-            if(cop == "="): cop = "=="
-
-            eval_expr = "(%s %s %s) and (%s %s %s)" % \
-                (phi1_duration, cop, deltatime,
-                 phi2_duration, cop, deltatime)
-             
-            satisfied = True if eval(eval_expr) else False   
+        if(predicate):
+            phi1_duration = (phi1_end - phi1_start)
+            phi2_duration = (phi2_end - phi2_start)
+            satisfied = predicate(phi1_duration) and predicate(phi2_duration)
 
             if __debug__:
                 satstr = "not" if not satisfied else "" 
                 self.logger.info(\
-                    "Eval expression %s satisfied %s by %s <-> %s" % \
-                    (eval_expr, satstr, phi1, phi2))
+                    "dur constraint on durations %s, %s %s %s %s satisfied" % \
+                    (phi1_duration, phi2_duration, predicate.relop, 
+                     predicate.delta, satstr))
         else:
             #-------------------------------------------------
             # Default eq semantics
@@ -328,8 +439,7 @@ class ITLOpsProcessor:
         if(constraints):
             ctuple = constraints.get_constraint()
             (cname, cop, cval, cqual) = ctuple
-            deltatime = Time()
-            deltatime.set_time_from_str(cval, cqual)
+            deltatime = constraints.get_timedelta()
             self.logger.info("Time delta :%s" % (deltatime))
 
         parop_instances = \
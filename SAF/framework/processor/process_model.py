@@ -65,6 +65,9 @@ class ModelProcessor:
         self.globalsyms = symt
         self.qualifierstate = None
         self.icache = icache
+        # Time range (in usecs) of the QUALIFIER instances when the model is
+        # applied over a window of the timeline
+        self.window = None
                 
         self.state_proc      = StateProcessor(self.logger, 
                                               self.dh,
@@ -119,6 +122,128 @@ class ModelProcessor:
                                      treelevel)
         
     
+    def set_window(self, window):
+        """
+            Restricts the instances of a QUALIFIER to the ones starting 
+            within window, a (start, end) tuple of usecs. The behaviors are
+            then evaluated over the events of the window only. 
+        """
+        self.window = window
+
+    def get_instances_in_window(self, binstances):
+        (start, end) = self.window
+        return BehaviorInstanceList([inst for inst in binstances 
+                            if start <= inst.get_starttime().get_usecs() <= end],
+                                    bobject=binstances.get_behavior())
+
+    def get_horizon(self, behavior):
+        """
+            Returns the longest time (in usecs) between the first and the 
+            last event of an instance of the behavior or None if there is 
+            no such bound.
+            
+            Every operator has to bound the time between its operands (see
+            get_operator_gap()). The logical operators other than 'or',
+            negations, recursion and constraints over counts of instances
+            leave the behavior unbounded as its instances then depend on
+            events which are arbitrarily far apart.
+        """
+        span = 0
+        objects = behavior.get_objects()
+        for (pos, obj) in enumerate(objects):
+            if(obj.get_negation()):
+                return None
+            if(obj.is_qualifier()):
+                if(self.get_horizon(obj.get_contents()) is None):
+                    return None
+            elif(obj.is_behavior_object()):
+                if(obj.get_contents().get_negation()):
+                    return None
+                subspan = self.get_horizon(obj.get_contents())
+                if(subspan is None):
+                    return None
+                span += subspan
+            elif(obj.is_state_node()):
+                constraints = self.globalsyms.get_state_constraint(
+                                                        obj.get_fullname())
+                bound = self.get_constraint_bound(constraints)
+                if(bound is None):
+                    return None
+                span += max(bound, 0)
+            elif(obj.is_leadsto_op() or obj.is_conc_op()):
+                gap = self.get_operator_gap(obj, objects[pos + 1:pos + 2])
+                if(gap is None):
+                    return None
+                span += gap
+            elif(not (obj.is_or_op() or obj.is_connect_op())):
+                return None
+
+        bound = self.get_constraint_bound(behavior.get_behavior_constraints())
+        if(bound is None):
+            return None
+        if(bound >= 0):
+            span = min(span, bound)
+        return span
+
+    def get_operator_gap(self, obj, nextobjs):
+        """
+            Returns the longest time (in usecs) the operator obj lets pass
+            between the instances of its operands in either direction or
+            None if there is no such bound. nextobjs holds the object
+            following the operator (if any).
+
+            The constraint of leadsto (t2_start <op> t1_end + delta) only
+            bounds the gap from both sides with '='. With '<' or '<=' any
+            earlier phi2 satisfies it unless phi2 is a dependent state,
+            which only matches events later than its phi1. The operators
+            olap and dur (without constraint) need overlapping instances
+            and sw and ew (without constraint or with '=') instances which
+            start or end a fixed time apart. Constraints of eq and dur
+            compare durations only.
+        """
+        cop = None
+        delta = 0
+        constraints = obj.get_constraints()
+        if(constraints and constraints.has_constraint()):
+            (cname, cop, cval, cqual) = constraints.get_constraint()
+            delta = abs(constraints.get_timedelta().get_usecs())
+        if(obj.is_leadsto_op()):
+            if(cop == '='):
+                return delta
+            if((cop in ('<', '<=')) and nextobjs and
+               nextobjs[0].is_state_node() and
+               self.globalsyms.is_state_dependent(nextobjs[0].get_fullname())):
+                return delta
+            return None
+        if(obj.is_olap_op()):
+            return 0
+        if(obj.is_sw_op() or obj.is_ew_op()):
+            if(cop is None):
+                return 0
+            if(cop == '='):
+                return delta
+            return None
+        if(obj.is_dur_op() and (cop is None)):
+            return 0
+        return None
+
+    def get_constraint_bound(self, constraints):
+        """
+            Returns the upper bound (in usecs) set by a duration constraint,
+            -1 for constraints checked on every instance by itself and None
+            for the ones which are not.
+        """
+        bound = -1
+        if((not constraints) or (not constraints.has_constraint())):
+            return bound
+        for key in constraints.get_active_constraints():
+            (cname, cop, cval, cqual) = constraints.get_constraint(key)
+            if((key == 'duration') and (cop in ('<', '<=', '='))):
+                bound = constraints.get_timedelta(key).get_usecs()
+            elif(key != '_eventno'):
+                return None
+        return bound
+
     def process_behavior(self, behaviorobj, recordids, treelevel, objlist=None,
                             callerobj=None, ignorequalifier=False):
         """
@@ -177,6 +302,12 @@ class ModelProcessor:
                                                treelevel + 3,
                                                callerobj=callerobj,
                                                ignorequalifier=ignorequalifier)
+                if(self.window and obj.is_qualifier() and 
+                   (ignorequalifier == False)):
+                    binstances = self.get_instances_in_window(binstances)
+                    if(not binstances):
+                        # An empty qualifier does not restrict the states
+                        return BehaviorInstanceList()
                 obj.add_instances(binstances)
 
                 # The QUALIFIER expression is treated as a behavior.
@@ -355,8 +486,7 @@ class ModelProcessor:
         if(constraints):
             ctuple = constraints.get_constraint()
             (cname, cop, cval, cqual) = ctuple
-            deltatime = Time()
-            deltatime.set_time_from_str(cval, cqual)
+            deltatime = constraints.get_timedelta()
             self.logger.info("Time delta :%s" % (deltatime))
 
         parop_instances = \
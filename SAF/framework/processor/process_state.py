@@ -26,6 +26,7 @@ from framework.objects.behaviorinstancelist import BehaviorInstanceList
 from framework.processor.process_behaviorconstraints import BehaviorConstraintProcessor
 from framework.common.errordefs import SymbolTableError, StateRecordError
 from framework.objects.eventgroup import EventGroup
+from framework.common.idset import IdSet
 
 class StateProcessor:
 
@@ -39,7 +40,8 @@ class StateProcessor:
         self.sh          = statehandle
         self.globalsyms  = symt
         self.model_proc  = model_proc
-        self.qualifying_instances = BehaviorInstanceList()
+        # Set of event numbers of the instances of the qualifier
+        self.qualifying_instances = IdSet()
         
         self.behavior_cons_proc = BehaviorConstraintProcessor(self.logger,
                                                         self.dh,
@@ -49,7 +51,7 @@ class StateProcessor:
      
     def set_qualifying_instances(self, qual_inst):
         self.qualifying_instances = \
-                ",".join([str(r.get_id()) for r in qual_inst])
+                IdSet([r.get_id() for r in qual_inst])
 
     def process_state(self, stateobj, in_binstances, treelevel, callerobj=None):
         """
@@ -104,7 +106,7 @@ class StateProcessor:
         
         if(self.globalsyms.is_state_negated(fullobjname)):
             if(ret_instances):
-                insts_to_remove = ret_instances.get_ids()
+                insts_to_remove = set(ret_instances.get_ids())
                 neg_instances = BehaviorInstanceList() 
                 neg_instances.set_behavior(stateobj)
                 for inst in in_binstances:
@@ -198,7 +200,7 @@ class StateProcessor:
                 self.logger.fine("No records for state %s\n" % (stateobj.get_name()))
             return BehaviorInstanceList([], bobject=stateobj)
 
-        SREC_deleted_hash = {}
+        SREC_deleted = IdSet()
         #self.sh.cache_state_instances(binstances)
         return_list = BehaviorInstanceList()
 
@@ -214,11 +216,14 @@ class StateProcessor:
             self.logger.debug("Dependent State: length(SREC) : %d" % (len(SREC)))
        
         caller = callerobj or stateobj
+        (bindings, prefetched) = self.resolve_bindings(SREC, stateobj, caller)
         numinstances = len(SREC)    
         recindex = 0
         while recindex < numinstances:   
             # Read an instance
             r = SREC[recindex]
+            (currsrec, kvhash) = bindings[recindex]
+            ret_list = prefetched[recindex]
             recindex += 1
 
             recordid = r.get_id()
@@ -228,34 +233,23 @@ class StateProcessor:
                 self.logger.info("\n\nProcessing %s, %s" %(recordid, rectype))
 
             # Skip the instance if its marked deleted. 
-            if(recordid in SREC_deleted_hash):
+            if(recordid in SREC_deleted):
                 if __debug__:
                     self.logger.info("Record %s deleted in local hash!" % (recordid))  
                 continue
             
-            currsrec = self.sh.get_record(recordid)
             if(currsrec ==  None):
                 if __debug__:
                     self.logger.fine("Record %s deleted in state database!" %\
                                   (recordid))  
                 continue
 
-            # Bind the state definition with values from actual event with
-            # id recordid
-            # currsrec is corresponding state record
-            mainns = self.model_proc.model.get_tree().get_namespace()
-            kvhash = resolver.resolve_state(self.logger,
-                                            r,
-                                            currsrec, 
-                                            stateobj, 
-                                            self.globalsyms, 
-                                            caller,
-                                            mainns=mainns)
             if not kvhash: continue
             if __debug__:
                 self.logger.info("Resolved state: %s" % (kvhash))
             
-            ret_list = self.dh.get_binstances_satisfying_state(
+            if(ret_list is None):
+                ret_list = self.dh.get_binstances_satisfying_state(
                                         stateobj, 
                                         kvhash,
                                         instances=self.qualifying_instances,
@@ -265,7 +259,7 @@ class StateProcessor:
             # Remove already processed records
             ret_group = EventGroup()
             for c in ret_list.get_contents():
-                if(c.get_id() not in SREC_deleted_hash):
+                if(c.get_id() not in SREC_deleted):
                     ret_group.add(c)
             
             if __debug__:
@@ -328,7 +322,7 @@ class StateProcessor:
 
                     self.do_removal_and_updates(constrained_group.get_contents(),
                                                 r,
-                                                SREC_deleted_hash,
+                                                SREC_deleted,
                                                 currsrec,
                                                 options,
                                                 caller,
@@ -342,7 +336,7 @@ class StateProcessor:
                     if __debug__: 
                         self.logger.fine("Current Return List: %s" % \
                                        (return_list))
-        SREC_deleted_hash.clear()
+        SREC_deleted.clear()
         self.sh.commit_transaction()
         self.sh.flush_cache()
 
@@ -351,9 +345,48 @@ class StateProcessor:
         return return_list
     
     
+    def resolve_bindings(self, SREC, stateobj, caller):
+        """
+            Binds the state definition with values from every instance in 
+            SREC and answers all the bindings together. Returns the list of
+            (state record, kvhash) for the instances and the list of 
+            prefetched EventGroups (None where the binding is left to be 
+            answered on its own).
+            
+            Resolving up front is safe because a record updated or removed 
+            while processing an instance is also marked deleted and is 
+            never processed afterwards.
+        """
+        mainns = self.model_proc.model.get_tree().get_namespace()
+        bindings = []
+        for r in SREC:
+            kvhash = None
+            currsrec = self.sh.get_record(r.get_id())
+            if(currsrec != None):
+                # currsrec is corresponding state record
+                kvhash = resolver.resolve_state(self.logger,
+                                                r,
+                                                currsrec, 
+                                                stateobj, 
+                                                self.globalsyms, 
+                                                caller,
+                                                mainns=mainns)
+            bindings.append((currsrec, kvhash))
+
+        positions = [i for (i, (c, kvhash)) in enumerate(bindings) if kvhash]
+        prefetched = [None] * len(SREC)
+        results = self.dh.get_binstances_satisfying_bindings(
+                                    stateobj,
+                                    [bindings[i][1] for i in positions],
+                                    instances=self.qualifying_instances,
+                                    fullobjname=stateobj.get_fullname())
+        for (i, evgroup) in zip(positions, results):
+            prefetched[i] = evgroup
+        return (bindings, prefetched)
+
     def do_removal_and_updates(self, evgroup,
                                      r,
-                                     SREC_deleted_hash,
+                                     SREC_deleted,
                                      currsrec,
                                      options,
                                      callerobj,
@@ -371,7 +404,7 @@ class StateProcessor:
             for el in evgroup:
                 e = el.get_id()
                 self.sh.remove_record(e)
-                SREC_deleted_hash[e] = 'DELETED'
+                SREC_deleted.add(e)
             laste = evgroup[-1].get_id()
             #options['col0'] = e
             evhash = evgroup[-1].get_avhash()
@@ -19,11 +19,15 @@
 # Author: Arun Viswanathan (aviswana@usc.edu)
 #------------------------------------------------------------------------------
 
+from bisect import bisect_left, bisect_right, insort
+
 import framework.common.sqlutils as sqlutils
 from framework.objects.behaviorinstancelist import BehaviorInstanceList
 from framework.objects.event import Event
 from framework.objects.eventgroup import EventGroup
 from framework.objects.timeobject import Time
+from framework.objects.constraints import get_relop_function
+from framework.common.utils import get_satisfying_ranges
 
 class LTLOpsProcessor:
     """
@@ -103,8 +107,7 @@ class LTLOpsProcessor:
         if(constraints):
             ctuple = constraints.get_constraint()
             (cname, cop, cval, cqual) = ctuple
-            deltatime = Time()
-            deltatime.set_time_from_str(cval,cqual)
+            deltatime = constraints.get_timedelta()
             self.logger.info("Time delta :%s" % (deltatime))
         
   
@@ -190,23 +193,9 @@ class LTLOpsProcessor:
                 if(phi1 == phi2):
                     continue
                 
-                t1_start = phi1.get_starttime()
-                atleast_count = phi1.get_atleast_count()
-                if(atleast_count):
-                    t1_end = phi1.get_endtime(index=atleast_count)
-                else:
-                    t1_end = phi1.get_endtime()
-                
-                t2_start = phi2.get_starttime()
-                atleast_count = phi2.get_atleast_count()
-                if(atleast_count):
-                    t2_end = phi2.get_endtime(index=atleast_count)
-                else:
-                    t2_end = phi2.get_endtime()
-                     
-                
-                if(self.check_semantics(t1_start, t1_end, t2_start, t2_end, 
-                                     deltatime, cop)):
+                threshold = self.get_leadsto_threshold(phi1, deltatime, cop)
+                if(self.check_semantics(float(phi2.get_starttime()), 
+                                        threshold, deltatime, cop)):
                     phi2.add(phi1)
                     phi2.set_behavior(nextobj.get_parent())
                     #phi2.set_behavior(nextobj.get_rootbehavior())
@@ -219,43 +208,9 @@ class LTLOpsProcessor:
             if __debug__: 
                 self.logger.info("Leadstoop case: Phi1 and phi2 are independent")
             
-            index = 0            
-            for phi1 in phi1_instances:
-                for phi2 in phi2_instances[index:]:
-                    if __debug__:
-                        self.logger.debug("Processing phi1 = %s <--> phi2 = %s" %\
-                              (phi1, phi2))  
-                    if(phi1 == phi2):
-                        index += 1
-                        continue
-                    
-                    t1_start = phi1.get_starttime()
-                    atleast_count = phi1.get_atleast_count()
-                    if(atleast_count):
-                        t1_end = phi1.get_endtime(index=atleast_count)
-                    else:
-                        t1_end = phi1.get_endtime()
-                    
-                    t2_start = phi2.get_starttime()
-                    atleast_count = phi2.get_atleast_count()
-                    if(atleast_count):
-                        t2_end = phi2.get_endtime(index=atleast_count)
-                    else:
-                        t2_end = phi2.get_endtime()    
-                    
-                    if(self.check_semantics(t1_start, t1_end, t2_start, t2_end, 
-                                     deltatime, cop)):
-                        if(isinstance(phi2,Event)):
-                            neweg = EventGroup(bobject=nextobj.get_parent())
-                            #neweg = EventGroup(bobject=nextobj.get_rootbehavior())
-                            neweg.add(phi1)
-                            neweg.add(phi2)
-                            newinstlist.insert(neweg)
-                        else:
-                            phi2.add(phi1)
-                            newinstlist.insert(phi2)
-                        index += 1
-                        break
+            self.sweep_leadsto_instances(phi1_instances, phi2_instances,
+                                         nextobj, newinstlist, 
+                                         deltatime, cop)
         elif((phi1_dependent == True) and 
              (phi2_dependent == True)):
             raise Exception("UNHANDLED case for leadsto semantics!")
@@ -263,17 +218,157 @@ class LTLOpsProcessor:
         return newinstlist 
     
     
-    def check_semantics(self, t1_start, t1_end, t2_start, t2_end, 
-                                     deltatime, cop):
+    def sweep_leadsto_instances(self, phi1_instances, phi2_instances,
+                                nextobj, newinstlist, deltatime, cop):
+        """
+            Pairs every phi1 instance with the first phi2 instance satisfying
+            the leadsto semantics (independent phi1 and phi2).
+            
+            phi2_instances are kept sorted by starttime by the 
+            BehaviorInstanceList. The satisfying phi2 instances for a given
+            phi1 therefore lie in at most two contiguous ranges of the list
+            which are located by a binary search over the numeric starttimes
+            instead of testing every (phi1, phi2) pair.
+            
+            The scan semantics of the pairwise algorithm are retained:
+             - the search for a phi1 starts at position 'index' of phi2
+             - 'index' advances by one for a match and for every phi2 
+               equal to phi1 passed over during the search
+             - non-event phi2 instances absorb the matched phi1 and hence 
+               have their starttime changed. Such positions are re-checked
+               against their current starttime.
+        """
+        starts = [float(phi2.get_starttime()) for phi2 in phi2_instances]
+        numphi2 = len(starts)
+        for i in xrange(1, numphi2):
+            if(starts[i] < starts[i-1]):
+                # The instances were modified after being inserted in the 
+                # list and are not ordered by starttime anymore.
+                if __debug__:
+                    self.logger.info("phi2 instances out of order. Using pairwise scan")
+                return self.scan_leadsto_instances(phi1_instances, 
+                                                   phi2_instances,
+                                                   nextobj, newinstlist,
+                                                   deltatime, cop)
         
+        relop = self.get_leadsto_relop(deltatime, cop)
+        compare = get_relop_function(relop)
+        
+        # Positions of phi2 instances modified during the sweep along 
+        # with their current starttimes
+        modified = []
+        modified_starts = {}
+
+        index = 0
+        for phi1 in phi1_instances:
+            if(index >= numphi2):
+                break
+            t1_start = float(phi1.get_starttime())
+            threshold = self.get_leadsto_threshold(phi1, deltatime, cop)
+            ranges = get_satisfying_ranges(starts, relop, threshold)
+
+            match = None
+            visited = []
+            pos = index
+            while pos < numphi2:
+                # Next position which is either statically satisfying 
+                # or was modified and needs to be checked again
+                nextpos = numphi2
+                for (lo, hi) in ranges:
+                    if(lo < hi and pos < hi):
+                        nextpos = max(pos, lo)
+                        break
+                m = bisect_left(modified, pos)
+                if(m < len(modified) and modified[m] <= nextpos):
+                    nextpos = modified[m]
+                if(nextpos >= numphi2):
+                    break
+                
+                phi2 = phi2_instances[nextpos]
+                if __debug__:
+                    self.logger.debug("Processing phi1 = %s <--> phi2 = %s" %\
+                              (phi1, phi2))  
+                visited.append(nextpos)
+                satisfied = True
+                if(nextpos in modified_starts):
+                    satisfied = compare(modified_starts[nextpos], threshold)
+                if(satisfied and (phi1 != phi2)):
+                    match = nextpos
+                    break
+                pos = nextpos + 1
+            
+            # Account for the phi2 instances equal to phi1 which the 
+            # pairwise scan would have skipped over. Such instances have 
+            # the same starttime as phi1. 
+            last = numphi2 if (match is None) else match
+            candidates = set(visited)
+            lo = max(index, bisect_left(starts, t1_start))
+            hi = min(last, bisect_right(starts, t1_start))
+            candidates.update(xrange(lo, hi))
+            for p in candidates:
+                if((p < last) and (phi2_instances[p] == phi1)):
+                    index += 1
+                    
+            if(match is None):
+                continue
+            
+            phi2 = phi2_instances[match]
+            if(isinstance(phi2,Event)):
+                neweg = EventGroup(bobject=nextobj.get_parent())
+                #neweg = EventGroup(bobject=nextobj.get_rootbehavior())
+                neweg.add(phi1)
+                neweg.add(phi2)
+                newinstlist.insert(neweg)
+            else:
+                phi2.add(phi1)
+                newinstlist.insert(phi2)
+                if(match not in modified_starts):
+                    insort(modified, match)
+                modified_starts[match] = float(phi2.get_starttime())
+            index += 1
+        return newinstlist
+
+
+    def scan_leadsto_instances(self, phi1_instances, phi2_instances,
+                               nextobj, newinstlist, deltatime, cop):
+        """
+            Pairwise leadsto evaluation over independent phi1 and phi2.
+            Used when phi2 instances are not ordered by their starttime.
+        """
+        index = 0            
+        for phi1 in phi1_instances:
+            threshold = self.get_leadsto_threshold(phi1, deltatime, cop)
+            for phi2 in phi2_instances[index:]:
+                if __debug__:
+                    self.logger.debug("Processing phi1 = %s <--> phi2 = %s" %\
+                          (phi1, phi2))  
+                if(phi1 == phi2):
+                    index += 1
+                    continue
+                
+                if(self.check_semantics(float(phi2.get_starttime()), 
+                                        threshold, deltatime, cop)):
+                    if(isinstance(phi2,Event)):
+                        neweg = EventGroup(bobject=nextobj.get_parent())
+                        neweg.add(phi1)
+                        neweg.add(phi2)
+                        newinstlist.insert(neweg)
+                    else:
+                        phi2.add(phi1)
+                        newinstlist.insert(phi2)
+                    index += 1
+                    break
+        return newinstlist
+
+
+    def get_leadsto_relop(self, deltatime, cop):
         #-------------------------------------------------
         # Default leadsto semantics
         #
         # Behavior is valid if t2_start >= t1_end 
         #-------------------------------------------------
         relop = ">="
-        eval_expr = "%s %s %s" % (t2_start, relop, t1_end)
-
+        
         #------------------------------------------------------
         # leadsto semantics with operator constraints specified 
         # 
@@ -283,15 +378,33 @@ class LTLOpsProcessor:
             relop = cop
             if(relop == "="):
                 relop = "=="
-            eval_expr = "%s %s %s" % (t2_start, relop, (t1_end + deltatime))
+        return relop
+    
+    
+    def get_leadsto_threshold(self, phi1, deltatime, cop):
+        """
+            Returns the time (as a float) which the starttime of a phi2 
+            instance is compared against for the given phi1 instance
+        """
+        atleast_count = phi1.get_atleast_count()
+        if(atleast_count):
+            t1_end = phi1.get_endtime(index=atleast_count)
+        else:
+            t1_end = phi1.get_endtime()
         
-        if __debug__: 
-            self.logger.info("Eval expression for constraints %s" % \
-                (eval_expr))
+        if(deltatime and cop):
+            return float(t1_end + deltatime)
+        return float(t1_end)
 
-        if eval(eval_expr):
-            if __debug__:
-                self.logger.info("Eval expression %s satisfied" % (eval_expr))
-            return True
-        else:
-            return False
+
+    def check_semantics(self, t2_start, threshold, deltatime, cop):
+        """
+            Checks 't2_start <relop> threshold' where threshold is the 
+            endtime of phi1 optionally shifted by the operator constraint
+        """
+        relop = self.get_leadsto_relop(deltatime, cop)
+        satisfied = get_relop_function(relop)(t2_start, threshold)
+        if __debug__: 
+            self.logger.info("Constraint %s %s %s satisfied: %s" % \
+                (t2_start, relop, threshold, satisfied))
+        return satisfied
@@ -20,6 +20,42 @@
 #------------------------------------------------------------------------------
 
 import sys
+
+# Kinds of slots in a state template
+SLOT_ANY, SLOT_CONST, SLOT_INDEP, SLOT_DEP = range(4)
+
+
+def compile_state(symt, ns, name):
+    """
+        Compiles the state expression of ns.name into a template which is a
+        list of (attribute, kind, source) slots. The source is the constant
+        value of a SLOT_CONST slot and the key into the history of a 
+        SLOT_DEP slot. 
+    """
+    query = symt.get_symbol(ns, name)
+    template = []
+    for k, v in query.items():
+        vtype = symt.symtype(v)
+        if(vtype == symt.get_code_any()):
+            template.append((k, SLOT_ANY, '*'))
+        elif(vtype == symt.get_code_const()):
+            template.append((k, SLOT_CONST, v))
+        elif (vtype == symt.get_code_indep()):
+            template.append((k, SLOT_INDEP, k))
+        elif (vtype == symt.get_code_dep()):
+            template.append((k, SLOT_DEP, v.replace('$', '')))
+    return template
+
+
+def get_state_template(symt, obj):
+    """ Returns the template of a state compiled on first use """
+    key = (obj.get_namespace(), obj.get_name())
+    template = symt.templates.get(key)
+    if(template is None):
+        template = symt.templates[key] = compile_state(symt, key[0], key[1])
+    return template
+
+
 def resolve_state(logger, binst, state_record, obj, symt, callerobj, mainns=None):
     """
         Binds a state expression to actual values
@@ -40,60 +76,30 @@ def resolve_state(logger, binst, state_record, obj, symt, callerobj, mainns=None
         logger.fine("Unpickled history from statedb:  %s" % (state_rec))
 
     state_expr = obj.get_contents()
-    name       = obj.get_name()
-    ns         = obj.get_namespace()
-    query      = symt.get_symbol(ns, name)
+    template = get_state_template(symt, obj)
     if __debug__: 
-        logger.fine("Fetched hash for symbol : %s.%s : %s" % \
-                       (ns, name, query))
-        
-    #query = queryc.copy()
-    #alias = obj.get_alias() or ""
-    
-#    if mainns:
-#        for k,v in query.items():
-#            fullname = [] 
-#            fullname.append(mainns)
-#            fullname.append(alias)
-#            fullname.append(k)
-#            fn = ".".join(fullname)
-#            if(symt.has_symbol(fn)):
-#                newv = symt.get_symbol(None, None, 
-#                                       fullname=fn)  
-#                vtype = symt.symtype(newv)
-#                if((vtype == symt.get_code_const()) or
-#                        (vtype == symt.get_code_any())):
-#                        query[k] = newv
+        logger.fine("Fetched template for symbol : %s.%s : %s" % \
+                       (obj.get_namespace(), obj.get_name(), template))
 
-    kvhash = {}  #kvhash contains all the attributes. 
-    for k, v in query.items():
-        newk = "%s.%s.%s" % (ns, name, k)
-        if __debug__:
-            logger.fine("Processing hash : Qualified Key = %s -> %s" \
-                          % (newk, v))
+    from_state = callerobj.is_state_node()
+    from_leadsto = (not from_state) and callerobj.is_leadsto_op()
 
-        vtype = symt.symtype(v)
-        if(vtype == symt.get_code_any()):
-            # Put a *
-            kvhash[k] = '*'
-        elif(vtype == symt.get_code_const()):
-            # Assign the constant as value
-            kvhash[k] = v
-        elif (vtype == symt.get_code_indep()):
-            if(callerobj.is_state_node()):
+    kvhash = {}  #kvhash contains all the attributes. 
+    for (k, kind, source) in template:
+        if(kind == SLOT_ANY or kind == SLOT_CONST):
+            kvhash[k] = source
+        elif(kind == SLOT_INDEP):
+            if(from_state):
                 kvhash[k] = data_rec[k]
-            elif(callerobj.is_leadsto_op()):
+            elif(from_leadsto):
                 kvhash[k] = '*'
-        elif (vtype == symt.get_code_dep()):
-            newv = v.replace('$', '')
+        else:
             # Assign the corresponding value for correlated key
             # from history
-            if __debug__:
-                logger.fine("New Value: %s"% (newv))
             try:
-                kvhash[k] = state_rec[newv]
+                kvhash[k] = state_rec[source]
             except:
-                if newv not in state_rec:
+                if source not in state_rec:
                     # FORWARD REFERENCE 
                     # Its possible that the referenced key has 
                     # no history in the state_rec due to forward reference.
@@ -106,7 +112,6 @@ def resolve_state(logger, binst, state_record, obj, symt, callerobj, mainns=None
                             logger.info("EXCEPTION:::Forward reference case exception while processing '%s'\n\
 \tkvhash = %s\n\n\tstate_rec=%s\n\n\tdata_rec=%s" %(k, kvhash, state_rec, data_rec))
                         return None
-                        #sys.exit(2)
 
     if __debug__:
         logger.fine("Resolved state expression '%s' ==> '%s" \
@@ -0,0 +1,108 @@
+# timewindows.py - Splits the timeline of the events into windows which are
+#                  evaluated separately and stitches the instances found
+#
+# Copyright (C) 2011 University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms are permitted
+# provided that the above copyright notice and this paragraph are
+# duplicated in all such forms and that any documentation, advertising
+# materials, and other materials related to such distribution and use
+# acknowledge that the software was developed by the University of
+# Southern California, Information Sciences Institute.  The name of the
+# University may not be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED "AS IS" AND WITHOUT ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, WITHOUT LIMITATION, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+# Author: Arun Viswanathan (aviswana@usc.edu)
+#------------------------------------------------------------------------------
+
+# Local Imports
+from framework.objects.behaviortree import Behavior
+from framework.objects.event import Event
+from framework.objects.eventgroup import EventGroup
+from framework.objects.behaviorinstancelist import BehaviorInstanceList
+
+
+def get_windows(timerange, count, horizon):
+    """
+        Splits the (first, last) timerange (in usecs) into count windows.
+        Returns a (start, end, ownstart, ownend) tuple for every window.
+        The events from start to end are evaluated and the instances
+        starting from ownstart up to (but excluding) ownend belong to the
+        window. A window extends past the next one by the horizon so that
+        every instance spanning at most the horizon is found whole by the
+        window it belongs to.
+    """
+    (first, last) = timerange
+    width = max(1, (last - first + count) / count)
+    windows = []
+    start = first
+    while(start <= last):
+        ownend = min(start + width, last + 1)
+        windows.append((start, ownend - 1 + horizon, start, ownend))
+        start = ownend
+    return windows
+
+
+def get_object_registry(behavior, registry=None):
+    """
+        Returns the behaviors and behavior tree objects of a model
+        (including the ones of the QUALIFIERs) by their id(). A process
+        forked after the model is parsed has its objects at the same ids.
+    """
+    if(registry is None):
+        registry = {}
+    if(id(behavior) in registry):
+        return registry
+    registry[id(behavior)] = behavior
+    for obj in behavior.get_objects():
+        registry[id(obj)] = obj
+        contents = obj.get_contents()
+        if(isinstance(contents, Behavior)):
+            get_object_registry(contents, registry)
+    return registry
+
+
+def pack_instance(inst):
+    """
+        Returns a behavior instance as nested tuples which can be sent
+        across processes. The behaviors are referred to by their id().
+    """
+    bid = None
+    if(inst.get_behavior() is not None):
+        bid = id(inst.get_behavior())
+    if(isinstance(inst, Event)):
+        return (bid, inst.schema.attrlist, inst.row)
+    return (bid, None, tuple([pack_instance(i) for i in inst.get_contents()]))
+
+
+def unpack_instance(packed, registry):
+    """ Returns the behavior instance for a packed one """
+    (bid, attrlist, contents) = packed
+    behavior = registry.get(bid)
+    if(attrlist is not None):
+        ev = Event(None, attrlist, contents)
+        ev.set_behavior(behavior)
+        return ev
+    return EventGroup([unpack_instance(p, registry) for p in contents],
+                      bobject=behavior)
+
+
+def stitch_instances(packedlists, registry, bobject=None):
+    """
+        Returns the BehaviorInstanceList of the instances found by the
+        windows. An instance found by more than one window is added once.
+    """
+    binstances = BehaviorInstanceList(bobject=bobject)
+    seen = set()
+    for packedlist in packedlists:
+        for packed in packedlist:
+            if(packed in seen):
+                continue
+            seen.add(packed)
+            binstances.insert(unpack_instance(packed, registry))
+    return binstances
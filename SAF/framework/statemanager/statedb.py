@@ -27,6 +27,7 @@ import cPickle
 import base64
 import math
 
+from collections import OrderedDict
 from time import time, asctime
 from threading import Lock
 
@@ -35,6 +36,9 @@ import framework.common.utils as utils
 from framework.common.storage import SqliteStorage
 from framework.common.sorted_collection import SortedCollection
 
+# Stores holding the state records
+STATESTORES = ["sqlite", "memory"]
+
 class StateRecord:
     '''
         A StateRecord object represents a record in the State database
@@ -52,8 +56,13 @@ class StateRecord:
                   'col8': 'etuples'
                  }
 
+    # Columns stored serialized in the state database
+    MARSHALLED_COLS = ('col2', 'col5', 'col6', 'col7', 'col8')
+
     def __init__(self, options=None):
         self.record = {}
+        # Values of serialized columns decoded so far
+        self.values = {}
         if options:
             self.set_record_from_dict(options)
 
@@ -69,9 +78,9 @@ class StateRecord:
     def get_attribute_types():
         # This is being returned as a manually coded list for 
         # reasons of efficiency and requirements of order
-        return ['number', 'text', 'text',
-                'text', 'text', 'text',
-                'text', 'text', 'text']
+        return ['number', 'text', 'blob',
+                'text', 'text', 'blob',
+                'blob', 'blob', 'blob']
 
     def set_record_from_dict(self, opts, unmarshal=False):
         self.record['col0'] = opts.get('col0', '')
@@ -100,17 +109,17 @@ class StateRecord:
         [
          self.record['col0'],
          self.record['col1'],
-         (marshal and utils.marshal(self.record['col2'])\
+         (marshal and utils.serialize(self.record['col2'])\
                     or  self.record['col2']),
          self.record['col3'],
          self.record['col4'],
-         (marshal and utils.marshal(self.record['col5'])\
+         (marshal and utils.serialize(self.record['col5'])\
                     or  self.record['col5']),
-         (marshal and utils.marshal(self.record['col6'])\
+         (marshal and utils.serialize(self.record['col6'])\
                     or  self.record['col6']),
-         (marshal and utils.marshal(self.record['col7'])\
+         (marshal and utils.serialize(self.record['col7'])\
                     or  self.record['col7']),
-         (marshal and utils.marshal(self.record['col8'])\
+         (marshal and utils.serialize(self.record['col8'])\
                     or  self.record['col8'])
                     ]
         return reclist
@@ -137,16 +146,19 @@ class StateRecord:
 #        return reclist
 
     def get_val(self, key):
+        """
+            Returns the value of a column. Serialized values read from the
+            state database are decoded once on first access.
+        """
+        if key in self.values:
+            return self.values[key]
         r = self.record.get(key, '')
         if(r is None):
             return ''
-        try:
-            unr = utils.unmarshal(r)
-            return unr
-        except cPickle.UnpicklingError:
-            return r
-        except EOFError as e:
-            return r
+        if(isinstance(r, buffer)):
+            r = utils.deserialize(r)
+            self.values[key] = r
+        return r
 
     def get_history(self):
         return self.get_val('col7') or {}
@@ -174,12 +186,18 @@ class StateDatabase(SqliteStorage):
     MAX_CACHE_SIZE = 100000
     PREFETCH_SIZE = 20000
 
-    def __init__(self, tempdir, logger, inmem=False):
+    def __init__(self, tempdir, logger, inmem=False, statestore="sqlite"):
         self.logger = logger
         self.tempdir = tempdir
         self.tablename = "state"
 
-        if inmem:
+        # The memory store keeps the records as python objects indexed by 
+        # table and recordid. They are written to the (in memory) SQLite 
+        # database only when the state is printed for debugging.
+        self.memstore = (statestore == "memory")
+        self.records = {}
+
+        if inmem or self.memstore:
             self.dbname = ":memory:"
         else:
             # Create a random name
@@ -188,7 +206,7 @@ class StateDatabase(SqliteStorage):
 
 
         if __debug__: self.logger.info("Connecting to database " + self.dbname)
-        SqliteStorage.__init__(self, self.dbname, self.logger, pragmas=True)
+        SqliteStorage.__init__(self, self.dbname, self.logger, profile='state')
         self.recordcache = {}
         self.removed_record_hash = {} # This is a hash for every transaction
         self.reslock = Lock()
@@ -236,6 +254,7 @@ class StateDatabase(SqliteStorage):
         if(not self.logger.isEnabledFor(self.logger.LOGLEVELS.get('state'))):
             return
 
+        self.write_records()
         sqlcmd = """ select * from %s """ % (self.tablename)
         (val, status) = self.execute_sql_returnall(sqlcmd)
         if(not val):
@@ -274,8 +293,8 @@ class StateDatabase(SqliteStorage):
             printstr = fstring % \
             (str(t[0]).center(col1w)[:col1w],
              str(t[1]).center(col2w)[:col2w],
-             str(utils.unmarshal(t[2])).replace('and', '').center(col3w)[:col3w],
-             str(utils.unmarshal(t[7])).replace('and', '').center(col4w)[:col4w]
+             str(utils.deserialize(t[2])).replace('and', '').center(col3w)[:col3w],
+             str(utils.deserialize(t[7])).replace('and', '').center(col4w)[:col4w]
              )
 
             if __debug__: self.logger.state(printstr)
@@ -285,13 +304,14 @@ class StateDatabase(SqliteStorage):
 
     def get_output(self, state, tablename=None):
         tablename = tablename or self.tablename
+        self.write_records()
         sqlcmd = """select output from %s where currstatename LIKE '%s%%'""" %\
             (tablename, state)
         (val, status) = self.execute_sql(sqlcmd)
         if(not val):
             if __debug__: self.logger.debug("NO output for state : " + state)
             return []
-        return  map(utils.unmarshal, val)
+        return  map(utils.deserialize, val)
 
 
     def prefetch_records(self, recordidlist, startrecordid=None):
@@ -347,6 +367,9 @@ class StateDatabase(SqliteStorage):
         if self.table_empty[self.tablename]:
             return None
 
+        if self.memstore:
+            return self.records.get(self.tablename, {}).get(recordid)
+
         # Check if the record exists in the cache
         if __debug__: 
             self.logger.fine("Cache State: %s"% (self.recordcache.keys()))
@@ -425,10 +448,21 @@ class StateDatabase(SqliteStorage):
             self.execute_sql(cmd % (name, name))
         self.commit_transaction()
         self.table_empty[self.tablename] = True 
+        if self.memstore:
+            self.records[self.tablename] = OrderedDict()
 
 
 
     def add_new_records(self, recordlist, values):
+        if self.memstore:
+            table = self.records.get(self.tablename, {})
+            for r in recordlist:
+                srecord = StateRecord(values)
+                srecord.record['col0'] = r.get_id()
+                table[r.get_id()] = srecord
+            self.table_empty[self.tablename] = False
+            return
+
         srecord = StateRecord(values)
         rec = srecord.get_record_as_list(marshal=True)
         paramlist = [(r.get_id(), rec[1], rec[2], rec[3], rec[4], rec[5], rec[6],
@@ -440,23 +474,29 @@ class StateDatabase(SqliteStorage):
         self.table_empty[self.tablename] = False
 
     def update_record(self, recordid, values):
+        if self.memstore:
+            self.update_memory_record(recordid, values)
+            return
+
         srecord = StateRecord(values)
         colvals = srecord.get_record_as_list(marshal=True)
         colnames = srecord.get_attribute_names()
 
         upd_string = ""
         upd_list = []
+        params = []
         for key, val in zip(colnames, colvals):
             if(val != ''):
-                s = "%s='%s'" % (key, val)
-                upd_list.append(s)
+                upd_list.append("%s=?" % (key))
+                params.append(val)
+        params.append(recordid)
 
         upd_string = ",".join(upd_list)
 
-        sqlcmd = """update %s SET %s  where recordid=%s""" %\
-         (self.tablename, upd_string, recordid)
+        sqlcmd = """update %s SET %s  where recordid=?""" %\
+         (self.tablename, upd_string)
         if __debug__: self.logger.fine("Executing SQL: " + sqlcmd)
-        self.execute_sql(sqlcmd)
+        self.execute_sql_returnall(sqlcmd, tuple(params))
         # Put the recordid in the deletedid list
         # And take the recordid in colval[0] off the deleted list 
         # if its not empty
@@ -467,6 +507,34 @@ class StateDatabase(SqliteStorage):
         except KeyError:
             pass
 
-
-
-
+    def update_memory_record(self, recordid, values):
+        """
+            Updates a record of the memory store like update_record() does
+            in the state database i.e. text columns are updated only when
+            given and serialized columns are always updated. The record is 
+            replaced and not modified since callers may hold the old one.
+        """
+        table = self.records.get(self.tablename, {})
+        oldrecord = table.get(recordid)
+        if(oldrecord is None):
+            return
+        newvals = StateRecord(values).record
+        srecord = StateRecord()
+        srecord.record = dict(oldrecord.record)
+        for (key, val) in newvals.iteritems():
+            if((key in StateRecord.MARSHALLED_COLS) or (val != '')):
+                srecord.record[key] = val
+        table[recordid] = srecord
+
+    def write_records(self):
+        """
+            Writes the records of the memory store to the state database
+        """
+        if not self.memstore:
+            return
+        for (tablename, table) in self.records.iteritems():
+            self.execute_sql("delete from %s" % (tablename))
+            paramlist = [tuple(srecord.get_record_as_list(marshal=True))
+                         for srecord in table.itervalues()]
+            sqlcmd = "insert into %s values (?,?,?,?,?,?,?,?,?)" % (tablename)
+            self.execute_many(sqlcmd, paramlist)
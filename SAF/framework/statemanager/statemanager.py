@@ -30,8 +30,8 @@ class StateManager(StateDatabase):
         Provides an abstraction for managing internal state.
     """
        
-    def __init__(self, logger, inmem, tempdir, symtable):
-        StateDatabase.__init__(self,tempdir, logger, inmem)
+    def __init__(self, logger, inmem, tempdir, symtable, statestore="sqlite"):
+        StateDatabase.__init__(self,tempdir, logger, inmem, statestore)
         self.logger  = logger
         self.globalsyms = symtable
         self.inmem = inmem
@@ -70,6 +70,7 @@ class StateManager(StateDatabase):
             total count of all tables from the tablelist
         """
         count = 0
+        self.write_records()
         if (tablename):
             sqlcmd = """select count(*) from %s where currstatename LIKE '%s%%'""" %\
                         (tablename, state)
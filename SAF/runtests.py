@@ -50,12 +50,15 @@ import unittest
 import testcmds
 import grammartest
 import getopt
+import sqlite3
+import threading
 try:
     from collections import OrderedDict
 except:
     from framework.common.dictionary import OrderedDict as OrderedDict
 
 from framework.common.utils import h1, h2, get_filename_with_time
+from framework.common.storage import ConnectionPool
 
 COVERAGECONF = "utils/dev/coverageconf"
 COVERAGEOUT  = "logs/"
@@ -224,6 +227,18 @@ class SimpleFeatureTests(TestBaseClass):
     def test_sconstraints(self):
         self.execute(OrderedDict(testcmds.featuretests_sconstraints))
 
+    def test_engines(self):
+        self.execute(OrderedDict(testcmds.featuretests_engines))
+
+    def test_statestores(self):
+        self.execute(OrderedDict(testcmds.featuretests_statestores))
+
+    def test_jobs(self):
+        self.execute(OrderedDict(testcmds.featuretests_jobs))
+
+    def test_windows(self):
+        self.execute(OrderedDict(testcmds.featuretests_windows))
+
 
 class SmokeTests(TestBaseClass):
     """ Test of simple features to quickly check functionality"""
@@ -298,6 +313,53 @@ class GrammarParsingTests(TestBaseClass):
         retval = grammartest.run_state_parse_tests(self.ebnf)
         self.assertTrue(retval)
 
+class ConnectionPoolTests(TestBaseClass):
+    """ Tests for the pool of read-only connections used by workers"""
+
+    def setUp(self):
+        TestBaseClass.setUp(self)
+        dbname = self.datadir + os.path.sep + "tcpudpdns_mix_20rec.sqlite"
+        self.pool = ConnectionPool(dbname, 2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_checkout_checkin(self):
+        first = self.pool.checkout()
+        second = self.pool.checkout()
+        self.assertTrue(first is not second)
+        self.assertEqual(self.pool.opened, 2)
+        (count,) = first.execute("select count(*) from PACKET_DNS").fetchone()
+        self.assertTrue(count > 0)
+        self.assertRaises(sqlite3.Error, second.execute,
+                          "create table T(a)")
+        self.pool.checkin(first)
+        self.assertTrue(self.pool.checkout() is first)
+        self.assertEqual(self.pool.opened, 2)
+        self.pool.checkin(first)
+        self.pool.checkin(second)
+        self.pool.close()
+        self.assertEqual(self.pool.opened, 0)
+
+    def test_checkout_blocks(self):
+        first = self.pool.checkout()
+        second = self.pool.checkout()
+        waiting = []
+        thread = threading.Thread(
+                    target=lambda: waiting.append(self.pool.checkout()))
+        thread.start()
+        thread.join(0.5)
+        # All connections are in use so the third checkout waits
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(waiting, [])
+        self.pool.checkin(second)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(waiting[0] is second)
+        self.assertEqual(self.pool.opened, 2)
+        self.pool.checkin(first)
+        self.pool.checkin(second)
+
 class PluginTests(TestBaseClass):
     
     def test_syslog_plugin(self):
@@ -418,6 +480,8 @@ if(alltests or featuretests):
     h1("Running Feature Tests")
     suite = unittest.TestLoader().loadTestsFromTestCase(SimpleFeatureTests)
     unittest.TextTestRunner(verbosity=2).run(suite)
+    suite = unittest.TestLoader().loadTestsFromTestCase(ConnectionPoolTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
 
 if(alltests or smoketests):
     h1("Running Smoke Tests")
@@ -32,6 +32,8 @@ try:
 	import time
 	from datetime import date
 	import commands
+	import multiprocessing
+	from StringIO import StringIO
 	
 	# Thirdparty libraries
 	from simpleparse.common import numbers, strings, comments
@@ -67,11 +69,14 @@ import framework.objects.behaviortree as EventGroup
 import framework.objects.behaviortree as BehaviorInstance
 import framework.objects.behaviortree as BehaviorInstanceList
 import framework.processor.process_model as processmodel
+import framework.processor.timewindows as timewindows
 import framework.common.utils as utils
 import framework.common.globalsym as globalsym
 import framework.common.log as log
 from framework.dal.dataabstraction import DataManager
+from framework.dal.columnstore import ColumnarEventStore, numpyfound
 from framework.statemanager.statemanager import StateManager
+from framework.statemanager.statedb import STATESTORES
 from framework.presentation.textsummary import DisplayTextSummary
 
 # Custom exceptions
@@ -82,6 +87,9 @@ VERSION = "0.2a"
 LANGUAGE_EBNF_FILE = 'framework/parser/language.ebnf'
 LOGDIR = "logs"
 
+# Engines for evaluating state propositions over the event database
+ENGINES = ["sqlite", "columnar"]
+
 # Flag for pretty printing
 pretty = False
 
@@ -97,6 +105,10 @@ showheap  = False
 if hpyfound and showheap:
 	h = hpy()
 
+# Arguments of a worker process applying models in parallel (inherited 
+# from the parent when the worker is forked)
+worker_args = None
+
 def main():
 	#FIXME: Shift the command line handling functions to 
 	# the newer argparse module. NOTE: argparse is supported only from 
@@ -109,7 +121,8 @@ def main():
 								  ['db=', 'model=', 'knowbase=',
 								   'verbose=',  'inmem', 'profile',
 								   'pretty', 'nofail', 
-								   'time', 'stats'])
+								   'time', 'stats', 'engine=', 'statestore=',
+								   'jobs=', 'windows='])
 	except getopt.error, msg:
 		usage()
 		sys.exit(2)
@@ -122,6 +135,10 @@ def main():
 	model     = None
 	inmem     = False
 	showstats = False
+	engine    = "sqlite"
+	statestore = "sqlite"
+	jobs      = 1
+	windows   = 1
 	
 	global pretty
 	global dont_report_fails
@@ -153,6 +170,29 @@ def main():
 		  	profile = True
 		elif option == '--stats':
 		  showstats = True
+		elif option == '--engine':
+		  engine = arg
+		  if engine not in ENGINES:
+			usage()
+			sys.exit(2)
+		  if engine == "columnar" and not numpyfound:
+			print "ERROR: The columnar engine requires NumPy!"
+			sys.exit(2)
+		elif option == '--statestore':
+		  statestore = arg
+		  if statestore not in STATESTORES:
+			usage()
+			sys.exit(2)
+		elif option == '--jobs':
+		  if (not arg.isdigit()) or (int(arg) < 1):
+			usage()
+			sys.exit(2)
+		  jobs = int(arg)
+		elif option == '--windows':
+		  if (not arg.isdigit()) or (int(arg) < 1):
+			usage()
+			sys.exit(2)
+		  windows = int(arg)
 		else:
 			usage()
 			sys.exit(2)
@@ -235,7 +275,7 @@ def main():
 		if profile:	
 			profilefile = LOGDIR + os.path.sep + utils.get_filename_with_time(prefix="p_", suffix=".prof")
 			cProfile.runctx(\
-			'apply_models(logger, evdb, tree,tempdir, globalsymt, inmem, modelattrs)',
+			'apply_models(logger, evdb, tree,tempdir, globalsymt, inmem, modelattrs, engine, statestore, jobs, windows)',
 				globals(),
 				locals(),
 				profilefile)
@@ -245,11 +285,12 @@ def main():
 						print_stats(50)
 
 		else:
-			apply_models(logger, evdb, tree,tempdir, globalsymt, inmem, modelattrs)
+			apply_models(logger, evdb, tree,tempdir, globalsymt, inmem, modelattrs,
+						 engine, statestore, jobs, windows)
 		
 		if __debug__:
-			logger.info("Event cache state  Hit Count: %s Miss Count: %s" %\
-					 (evdb.get_cache_stats()))
+			logger.info("Event cache state  Hit Count: %s Miss Count: %s "\
+						"Evictions: %s" % (evdb.get_cache_stats()))
 			logger.info("Event database stats: %s " % (evdb.get_stats()))
 	except SyntaxError as e:
 		t = """Syntax Error: Expected : %(expected)s Got : %(text)s"""
@@ -262,60 +303,297 @@ def main():
 		if __debug__:
 			traceback.print_exc()
 	finally:
+		evdb.close()
 		cleanup(logger, tempdir)
 
 
-def apply_models(logger, evdb, tree, tempdir, globalsymt, inmem, modelattrs):
+def apply_models(logger, evdb, tree, tempdir, globalsymt, inmem, modelattrs,
+				 engine="sqlite", statestore="sqlite", jobs=1, windows=1):
 	"""
-		Applies models over data
+		Applies models over data. With more than one job the groups of 
+		models sharing no states or behaviors are applied by a pool of 
+		worker processes and their outputs are shown in the order of the 
+		models. With more than one window, the models are applied one 
+		after another and the timeline is split into windows which are
+		evaluated by the pool.
 	"""
+	global worker_args
 
-	# Initialization of StateManager, DataManager,  ModelProcessor
-	# and Presentation modules
-	icache = {}
-	statehandle = StateManager(logger, inmem, tempdir, globalsymt);
-	datahandle	= DataManager(logger, evdb, globalsymt)	
-	mp = processmodel.ModelProcessor(logger, datahandle, statehandle, 
-									globalsymt, icache)
-	output = DisplayTextSummary(datahandle, statehandle)
+	columnstore = None
+	if(engine == "columnar"):
+		columnstore = ColumnarEventStore(logger, evdb)
 	
 	stime = time.time()
-	binstances = []
+	ninstances = 0
 	
 	modellist = tree.get_behaviors()	
-	for model in modellist:
-		modelname = model.get_name()
-		attrlist = modelattrs[modelname]
-		if __debug__:
-			logger.info("Model attributes for :" + str(model) + "\n\t"+str(attrlist))
-		try:
-			print("Processing model %s " % (modelname))
-			binstances = mp.get_instances_satisfying_model(model, evdb)
-			if (len(binstances) == 0):
-				if(not dont_report_fails):
-					print "NO instances found satisfying model %s\n" %(modelname)
-			utils.lprint(0, "Model %s satisfied by %d instances" %\
-                         (modelname, len(binstances)))
-			output.display_summary(modelname, 
-									model, pretty, binstances,attrlist);
-			
-			if(hpyfound and showheap):
-				print h.heap()
-				print h.iso(binstances)								
-		except ModelProcessingError:
-			if(not dont_report_fails):
-				print "Failure while processing model %s!" % (model)
-			pass
-		if __debug__:
-			logger.info("State Database stats : %s " % (statehandle.get_stats()))
+	groups = get_model_groups(modellist)
+	worker_args = (logger, evdb, tempdir, globalsymt, inmem, statestore,
+				   columnstore, modellist, modelattrs, jobs)
+	if((jobs > 1) and (len(groups) > 1) and (windows == 1)):
+		prepare_indexes(DataManager(logger, evdb, globalsymt, columnstore),
+						modellist)
+		cachestats = (0, 0, 0)
+		outputs = {}
+		nextindex = 0
+		for results in map_jobs(jobs, apply_models_job, groups):
+			for (index, text, count, stats) in results:
+				outputs[index] = (text, count, stats)
+			# Show the outputs of the models in order
+			while(nextindex in outputs):
+				(text, ninstances, stats) = outputs.pop(nextindex)
+				sys.stdout.write(text)
+				cachestats = tuple([a + b for (a, b) in 
+									zip(cachestats, stats)])
+				nextindex += 1
+	else:
+		processor = init_processor(logger, evdb, tempdir, globalsymt, inmem, 
+								   statestore, columnstore)
+		timerange = evdb.get_time_range()
+		for index in range(len(modellist)):
+			model = modellist[index]
+			timewindowlist = None
+			# Only a model which does not depend on the others and whose
+			# instances have a bounded span is split into windows
+			if((windows > 1) and ([index] in groups) and timerange):
+				horizon = processor[2].get_horizon(model)
+				if(horizon is not None):
+					timewindowlist = timewindows.get_windows(timerange, 
+															 windows, horizon)
+			binstances = apply_model(logger, evdb, processor, model, 
+									 modelattrs[model.get_name()], 
+									 index, timewindowlist)
+			ninstances = len(binstances)
+		cachestats = processor[1].get_cache_stats()
+
 	if(print_time):
 		etime = time.time()
 		print "Timing Results"
 		print "=============="
 		print "%-10s = %-10d\n%-10s = %d\n%-10s = %10s" %\
 		 ("Data Size", evdb.get_data_size(), 
-		  "Instances", len(binstances), 
+		  "Instances", ninstances, 
 		  "Time Taken", etime - stime)
+		print "%-10s = %d hits, %d misses, %d evictions" % \
+		 (("Query Cache",) + cachestats)
+
+def init_processor(logger, evdb, tempdir, globalsymt, inmem, statestore,
+				   columnstore):
+	"""
+		Returns the StateManager, DataManager, ModelProcessor and 
+		Presentation modules for applying models
+	"""
+	icache = {}
+	statehandle = StateManager(logger, inmem, tempdir, globalsymt, statestore);
+	datahandle	= DataManager(logger, evdb, globalsymt, columnstore)	
+	mp = processmodel.ModelProcessor(logger, datahandle, statehandle, 
+									globalsymt, icache)
+	output = DisplayTextSummary(datahandle, statehandle)
+	return (statehandle, datahandle, mp, output)
+
+def apply_model(logger, evdb, processor, model, attrlist, index=None,
+				timewindowlist=None):
+	"""
+		Applies a model over data, shows the instances satisfying it and 
+		returns them. The model (at index in the list of models) is applied
+		over every time window of timewindowlist by the pool if given.
+	"""
+	(statehandle, datahandle, mp, output) = processor
+	modelname = model.get_name()
+	binstances = []
+	if __debug__:
+		logger.info("Model attributes for :" + str(model) + "\n\t"+str(attrlist))
+	try:
+		print("Processing model %s " % (modelname))
+		if(timewindowlist):
+			binstances = apply_model_windows(model, index, timewindowlist)
+		else:
+			binstances = mp.get_instances_satisfying_model(model, evdb)
+		if (len(binstances) == 0):
+			if(not dont_report_fails):
+				print "NO instances found satisfying model %s\n" %(modelname)
+		utils.lprint(0, "Model %s satisfied by %d instances" %\
+                     (modelname, len(binstances)))
+		output.display_summary(modelname, 
+								model, pretty, binstances,attrlist);
+		
+		if(hpyfound and showheap):
+			print h.heap()
+			print h.iso(binstances)								
+	except ModelProcessingError:
+		if(not dont_report_fails):
+			print "Failure while processing model %s!" % (model)
+		pass
+	if __debug__:
+		logger.info("State Database stats : %s " % (statehandle.get_stats()))
+	return binstances
+
+def get_model_groups(modellist):
+	"""
+		Returns the lists of indices of models which have to be applied one
+		after another by the same ModelProcessor. Models sharing states or
+		behaviors are grouped together. A QUALIFIER is evaluated over the 
+		instances of the previous one, so a model is grouped with the one 
+		before it unless both have just the same QUALIFIER.
+	"""
+	groups = []
+	prevquals = None
+	for index in range(len(modellist)):
+		objects = modellist[index].get_reachable_objects()
+		names = set([o.get_fullname() for o in objects if not o.is_qualifier()])
+		quals = set([o.get_fullname() for o in objects if o.is_qualifier()])
+		indices = [index]
+		for group in groups[:]:
+			if((group[0] & names) or 
+			   ((index - 1 in group[1]) and 
+				((len(quals) != 1) or (quals != prevquals)))):
+				names |= group[0]
+				indices.extend(group[1])
+				groups.remove(group)
+		groups.append((names, sorted(indices)))
+		prevquals = quals
+	return sorted([indices for (names, indices) in groups])
+
+def apply_model_windows(model, index, timewindowlist):
+	"""
+		Applies the model at index over every time window with a pool of
+		worker processes and returns the instances found by the windows
+	"""
+	jobs = worker_args[9]
+	prepare_indexes(DataManager(worker_args[0], worker_args[1],
+								worker_args[3], worker_args[6]), [model])
+	packedlists = {}
+	arglist = [(index, w) for w in enumerate(timewindowlist)]
+	for (windex, packedlist) in map_jobs(jobs, apply_window_job, arglist):
+		packedlists[windex] = packedlist
+	utils.lprint(1, "Time windows .. %d (evaluated by %d jobs)" %\
+				 (len(timewindowlist), min(jobs, len(timewindowlist))))
+	registry = timewindows.get_object_registry(model)
+	return timewindows.stitch_instances([packedlists[w] for w in 
+										 sorted(packedlists)],
+										registry, model)
+
+def prepare_indexes(datahandle, models):
+	"""
+		Builds the indexes needed by the independent states of the models
+		(and of their QUALIFIERs) before forking worker processes whose
+		read-only connections can not build them. The indexes needed by
+		dependent states are reported back by the workers (see map_jobs).
+	"""
+	globalsymt = datahandle.globalsyms
+	for model in models:
+		mainns = model.get_tree().get_namespace()
+		objects = model.get_reachable_objects()
+		visited = set()
+		for obj in objects:
+			if(id(obj) in visited):
+				continue
+			visited.add(id(obj))
+			if(obj.is_qualifier() and
+			   isinstance(obj.get_contents(), behaviortree.Behavior)):
+				objects.extend(obj.get_contents().get_reachable_objects())
+			elif(obj.is_state_node() and
+				 (not globalsymt.is_state_dependent(obj.get_fullname()))):
+				datahandle.prepare_state(obj, mainns)
+
+def map_jobs(jobs, func, arglist):
+	"""
+		Yields the results of func for every argument of arglist (as they
+		are completed) computed by a pool of worker processes. Applying a 
+		model changes the behavior tree and the symbol table, so every 
+		argument is handled by a new worker forked from this process.
+
+		The indexes the workers needed but could not build are built once
+		all of them are done.
+	"""
+	missing = set()
+	pool = multiprocessing.Pool(min(jobs, len(arglist)), init_worker, 
+								maxtasksperchild=1)
+	try:
+		for (result, indexes) in pool.imap_unordered(run_job,
+									[(func, arg) for arg in arglist]):
+			missing.update(indexes)
+			yield result
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+	if(missing):
+		if __debug__:
+			worker_args[0].info("Building indexes needed by the workers: %s" %\
+								(sorted(missing)))
+		worker_args[1].add_indexes(sorted(missing))
+
+def run_job((func, arg)):
+	"""
+		Returns the result of func for arg in a worker process along with
+		the indexes needed by its queries which could not be built
+	"""
+	return (func(arg), worker_args[1].get_missing_indexes())
+
+def init_worker():
+	"""
+		Initializes a worker process with its own read-only connection to 
+		the event database and its own directory for state databases
+	"""
+	global worker_args
+	evdb = worker_args[1]
+	evdb.reconnect(readonly=True)
+	statedir = tempfile.mkdtemp(dir=worker_args[2])
+	worker_args = worker_args[:2] + (statedir,) + worker_args[3:]
+
+def apply_models_job(indices):
+	"""
+		Applies the models at indices in a worker process and returns the 
+		output, the number of instances and the query cache statistics of
+		every model
+	"""
+	(logger, evdb, tempdir, globalsymt, inmem, statestore, columnstore,
+	 modellist, modelattrs, jobs) = worker_args
+	processor = init_processor(logger, evdb, tempdir, globalsymt, inmem, 
+							   statestore, columnstore)
+	datahandle = processor[1]
+	results = []
+	for index in indices:
+		model = modellist[index]
+		before = datahandle.get_cache_stats()
+		stdout = sys.stdout
+		sys.stdout = StringIO()
+		try:
+			binstances = apply_model(logger, evdb, processor, model,
+									 modelattrs[model.get_name()])
+			text = sys.stdout.getvalue()
+		finally:
+			sys.stdout = stdout
+		stats = tuple([a - b for (a, b) in 
+					   zip(datahandle.get_cache_stats(), before)])
+		results.append((index, text, len(binstances), stats))
+	return results
+
+def apply_window_job((index, (windex, timewindow))):
+	"""
+		Applies the model at index over a time window in a worker process.
+		Returns the index of the window along with the packed instances
+		belonging to the window.
+	"""
+	(logger, evdb, tempdir, globalsymt, inmem, statestore, columnstore,
+	 modellist, modelattrs, jobs) = worker_args
+	(start, end, ownstart, ownend) = timewindow
+	processor = init_processor(logger, evdb, tempdir, globalsymt, inmem, 
+							   statestore, columnstore)
+	mp = processor[2]
+	mp.set_window((start, end))
+	# The progress of a window is not shown
+	stdout = sys.stdout
+	sys.stdout = StringIO()
+	try:
+		binstances = mp.get_instances_satisfying_model(modellist[index], evdb)
+	finally:
+		sys.stdout = stdout
+	return (windex, [timewindows.pack_instance(inst) for inst in binstances
+			if ownstart <= inst.get_starttime().get_usecs() < ownend])
 
 def header():
 	print """
@@ -334,6 +612,10 @@ Optional Arguments
 ==================
 	[--knowbase <knowledgebase dir> (default: ./knowbase)]
 	[--inmem ]
+	[--engine {sqlite|columnar}]
+	[--statestore {sqlite|memory}]
+	[--jobs <number of worker processes> (default: 1)]
+	[--windows <number of time windows> (default: 1)]
 	[--profile]
 	[--pretty]
 	[--nofail]
@@ -342,6 +624,17 @@ Optional Arguments
 Description
 ===========	
 --inmem     Creates the temp database in memory
+--engine    Engine answering state queries (default: sqlite). The columnar
+            engine loads event tables into NumPy arrays.
+--statestore Store for the intermediate state (default: sqlite). The memory
+            store keeps state records as python objects.
+--jobs      Applies the models of the script in parallel using the given
+            number of worker processes. Models sharing states or behaviors
+            are applied one after another by the same worker.
+--windows   Splits the timeline into the given number of windows which are
+            evaluated by the worker processes. Only models whose instances
+            span a bounded time (through the operator and duration 
+            constraints) are split.
 --showmdata Prints statistics about the events in the database
 --pretty    Prints Pretty Tabular Output
 --nofail    Dont show failures
@@ -365,7 +658,3 @@ if __name__ == '__main__':
 	if(not sqlitever):
 		raise "SAF requires SQLite 3.6 or greater!"
 	main()
-
-
-
-
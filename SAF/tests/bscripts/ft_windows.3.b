@@ -0,0 +1,41 @@
+###############################################################
+# Script  
+#	FT_WINDOWS_3
+#
+# Domain  
+#	NET/APP_PROTO
+#
+# Description       
+#	Pairs a late DNS response with an earlier DNS request. Both
+#	states are independent so a request long before the response
+#	satisfies the leadsto constraint.
+#
+# Constraints Specified
+#	 Request starting before 1s after the response. This does not 
+#	 bound the span of an instance so the model must not be split 
+#	 into time windows.
+#
+# Output    
+#	Outputs a record for every response paired with a request
+#
+# Output Event Name
+#	 DNS_LATE_EARLY
+#
+#Output Attributes     
+#	 eventno : Event number
+#	 dnsqrflag : DNS Query/Response Flag
+############################################################### 
+[header]
+NAMESPACE = TEST
+NAME = FT_WINDOWS_3
+QUALIFIER = {eventtype='PACKET_DNS'}
+
+[states]
+late = {dnsqrflag=1, eventno > 200}
+early = {dnsqrflag=0, eventno < 60}
+
+[behavior]
+b = late ~>[< 1s] early
+
+[model]
+DNS_LATE_EARLY(eventno, timestamp, timestampusec, dnsqrflag) =  b
@@ -51,7 +51,9 @@ featuretests_wildcards = {
 # Wildcards in values
 'ft_qualifier.6.1':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_qualifier.6.1.b ",
 # Wildcards in values
-'ft_qualifier.6.2':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_qualifier.6.2.b --pretty"
+'ft_qualifier.6.2':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_qualifier.6.2.b --pretty",
+# Negated wildcards in values
+'ft_qualifier.6.3':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_qualifier.6.3.b "
 }
 
 featuretests_relationalops = {
@@ -104,6 +106,34 @@ featuretests_import = {
 'ft_import.1':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_import.1.b --pretty",
 }
 
+featuretests_engines = {
+# Columnar engine (requires NumPy)
+'ft_engine_columnar.1':"--db %s/tcpudpdns_mix_298rec.sqlite   --model tests/bscripts/dnsreqres.b --engine columnar",
+'ft_engine_columnar.2':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_qualifier.6.b --engine columnar",
+'ft_engine_columnar.3':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_qualifier.7.b --pretty --engine columnar",
+}
+
+featuretests_statestores = {
+# State records kept as python objects
+'ft_statestore_memory.1':"--db %s/tcpudpdns_mix_298rec.sqlite   --model tests/bscripts/dnsreqres.b --statestore memory",
+'ft_statestore_memory.2':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_leadstoop.1.b --statestore memory",
+'ft_statestore_memory.3':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_bconstraint_icount.1 --pretty --statestore memory",
+}
+
+featuretests_jobs = {
+# Models applied by a pool of worker processes
+'ft_jobs.1':"--db %s/dnsflows_100rec.sqlite --model tests/bscripts/ft_sconstraint_bcount.1 --pretty --jobs 2",
+'ft_jobs.2':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_import.1.b --pretty --jobs 2",
+}
+
+featuretests_windows = {
+# Timeline split into windows evaluated by worker processes
+'ft_windows.1':"--db %s/tcpudpdns_mix_298rec.sqlite   --model tests/bscripts/ft_windows.1.b --windows 3 --jobs 2",
+'ft_windows.2':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_constraints.1.b --pretty --windows 4 --jobs 2",
+# Unbounded span (independent phi2 of leadsto) is not split into windows
+'ft_windows.3':"--db %s/tcpudpdns_mix_298rec.sqlite   --model tests/bscripts/ft_windows.3.b --windows 3 --jobs 2",
+}
+
 featuretests_errors = {
 'ft_errors.1':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_errors.1.b --pretty",
 'ft_errors.2':"--db %s/tcpudpdns_mix_20rec.sqlite   --model tests/bscripts/ft_errors.2.b --pretty",